@@ -19,9 +19,49 @@
 #
 
 import sys
+import os
+import io
+import gzip
+import argparse
+import contextlib
+import time
 import sqlite3
 import re
-from operator import itemgetter, attrgetter, methodcaller
+import fnmatch
+import heapq
+import bisect
+import zlib
+import json
+import ast
+import struct
+import zipfile
+import multiprocessing
+import cProfile
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from urllib.request import pathname2url
+from array import array
+from math import isnan
+from datetime import datetime, timedelta, timezone
+from collections import OrderedDict
+
+# NumPy is optional, it vectorizes the parallelism and histogram counts
+try:
+    import numpy
+except ImportError:
+    numpy = None
+# pyarrow is optional, it adds the Arrow IPC and Parquet exports
+try:
+    import pyarrow
+    import pyarrow.feather
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+# resource is Unix only, it reads the peak RSS for the profile
+try:
+    import resource
+except ImportError:
+    resource = None
 
 #
 # Note: you can find these tables and their members directly
@@ -41,33 +81,40 @@ BUILD_ORM_COMPLETED_ON=5
 BUILD_ORM_OUTCOME=6
 BUILD_ORM_PROJECT_ID=9
 # Index into orm_target table
+TARGET_ORM_ID=0
 TARGET_ORM_TARGET=1
 TARGET_ORM_TASK=2
 TARGET_ORM_BUILD_ID=6
 # Index into orm_project table
+PROJECT_ORM_ID=0
 PROJECT_ORM_NAME=1
 # Index into orm_task table
+TASK_ORM_ID=0
 TASK_ORM_NAME=6
 TASK_ORM_START=22
 TASK_ORM_STOP=21
 TASK_ORM_BUILD_ID=15
 TASK_ORM_RECIPE_ID=16
 # Index into orm_recipe table
+RECIPE_ORM_ID=0
 RECIPE_ORM_NAME=2
-# Index into taskList
+# Index into orm_task_dependency table
+TASK_DEPENDENCY_ORM_TASK_ID=1
+TASK_DEPENDENCY_ORM_DEPENDS_ON_ID=2
+# Index into taskList rows (see SpanTable.row)
 TASK_RECIPE=0
 TASK_NAME=1
 TASK_START=2
 TASK_STOP=3
 TASK_OVERCOUNT=4
 TASK_OVERLIST=5
-# Index into recipeList
+# Index into recipeList rows
 RECIPE_NAME=0
 RECIPE_START=1
 RECIPE_STOP=2
 RECIPE_OVERCOUNT=3
 RECIPE_OVERLIST=4
-# Index into taskTimeList,recipeTimeList
+# Index into taskTimeList,recipeTimeList rows (see EventTable.row)
 START=1
 STOP=2
 TIME_STATE=0
@@ -78,27 +125,31 @@ TIME_TASK=4
 
 # The database objects
 database_file = None
+database_access = 'rw'
+database_readonly = False
 conn = None
 build_cursor = None
-project_cursor = None
-target_cursor = None
 
 # The data structures
-build=None
-taskList = []
-recipeList = []
-taskTimeList = []
-recipeTimeList = []
-build_data={}
-
-# Statistics for displaying columns
-recipe_length_max = 0
-task_length_max = 0
-task_execute_max = 0
-recipe_execute_max = 0
+#   each loaded build is a BuildAnalysis object (see below),
+#   'current' is the build that the commands work on
+current=None
+
+# In-memory LRU of loaded builds
+BUILD_LRU_MAX=8                  # max number of loaded builds
+BUILD_LRU_TASKS_MAX=200000       # max total tasks across the loaded builds
 
 # debug support
 RECORD_MAX=None  # None for all, else max number of records to read
+OVERLAPS_EAGER=False  # True to compute every overlap list at load time
+
+# Persistent build cache
+CACHE_VERSION=4                  # bump when the cached lists change shape
+CACHE_SIZE_MAX=256*1024*1024     # eviction limit on total cache bytes, 0 to disable
+CACHE_SUFFIX='.overlap-cache'    # sidecar file next to the database
+
+# Parallel build loading
+LOAD_JOBS=os.cpu_count() or 1    # max worker processes for multi-build loads, 1 to disable
 
 COMMAND_LINE_PROJ = "Command Line"
 NO_TARGET = "No_Target"
@@ -112,7 +163,8 @@ def show_help():
     print('=== event_overlap.py ===')
     print('Commands:')
     print(' ?                           : show help')
-    print(' b,build   [build_id]        : show or select builds')
+    print(' b,build   [build_id]        : show or select builds (* = loaded)')
+    print(' b,build   [option=value ...] : show builds by outcome|project|since|until|sort|limit|offset')
     print(' d,data                      : show histogram data')
     print(' t,task    [task]            : show task database')
     print(' r,recipe  [recipe]          : show recipes database')
@@ -124,36 +176,100 @@ def show_help():
     print(' G,Graph   [recipe] [> file] : graph recipe execution overlap')
     print(' h,html    [task]   [> file] : HTML graph task execution overlap [to file]')
     print(' H,Html    [recipe] [> file] : HTML graph recipe execution overlap [to file]')
+    print(' j,json    [task]   [> file] : Chrome trace JSON of the tasks and recipes [to file]')
+    print(' x,compare [build_ids] [> file] : compare against baseline build(s)')
+    print(' c,critical [n]     [> file] : show the critical path and the n most constraining')
+    print(' u,util    [seconds] [> file] : show the task concurrency timeline (CSV or .json)')
+    print(' a,at      <time>    [> file] : show the tasks running at a time')
+    print(' f,follow  [seconds]          : follow an IN_PROGRESS build, Ctrl-C to stop')
+    print(' w,window  <time> <time> [> file] : show the tasks running in a time window')
+    print(' p,profile [on [dump]|off]   : show the profiled phases, or turn profiling on/off')
+    print(' s,save    <file>            : export the build as columns (.npz|.arrow|.parquet)')
+    print(' l,load    <file>            : import an exported build, without the database')
     print(' q,quit                      : quit')
     print('')
     print("Examples: ")
     print("  * Recipe/task filters accept wild cards, like 'native-*, '*-lib*'")
     print("  * Recipe/task filters get an automatic wild card at the end")
+    print("  * Filters are shell-style patterns ('*', '?', '[seq]'), so 'gtk+' is literal")
     print("  * Task names are in the form 'recipe:task', so 'acl*patch' ")
     print("    will specifically match the 'acl*:do_patch' task")
     print("  * Use 'o 2' for the tasks in the two highest overlap count sets")
     print("  * Use 'O 0' for the recipes with zero overlaps")
     print("  * Use 'd' to see the distribution of parallel and overlap execution")
+    print("  * Graphs written to a '.gz' file are gzip-compressed")
+    print("  * Use 'j > build.json' and open it in https://ui.perfetto.dev or chrome://tracing")
+    print("  * Use 'b outcome=failed sort=-completed limit=20' for the last 20 failed builds")
+    print("  * Use 'x 1-50' to compare with the mean of builds 1 to 50")
+    print("  * Use 'u 10 > timeline.json' for the concurrency of each 10 seconds")
+    print("  * Times are UTC 'HH:MM:SS', '+seconds' from the first task start,")
+    print("    or 'YYYY-MM-DDTHH:MM:SS', like 'at 14:03:12' or 'w +600 +660'")
+    print("  * Use 'p on run1' to also write run1.prof (cProfile) and run1.malloc.txt")
+    print("  * Use 's build.npz' for NumPy, '.arrow' or '.parquet' files need pyarrow")
+    print("  * Run 'event_overlap.py --help' for the batch commands")
     print('')
 
 #################################
 # set up task/recipe filter
-#   auto-append wildcard
-#   convert '*' to regex
-#   return compiled regex filter
+#   fnmatch-style patterns: '*' is any text, '?' any character and
+#   '[seq]' any character in seq, the other characters match
+#   themselves (so 'gtk+' is the recipe 'gtk+', not a regex)
+#   auto-append wildcard, the pattern matches from the start of the
+#   'recipe:task' key of a task, or the name of a recipe
+#   the compiled filters are kept in an LRU, and a pure prefix
+#   pattern like 'native-*' needs no regex at all
+#   (see SpanTable.filter_rows for the rows of a table)
+#
+
+FILTER_CACHE_MAX=64   # max number of compiled filters kept
+
+filter_cache=OrderedDict()
+
+class Filter:
+    def __init__(self,filter_string):
+        # auto wildcard at end
+        if (0 == len(filter_string)) or ('*' != filter_string[-1]):
+            filter_string = filter_string + '*'
+        self.pattern = filter_string
+        body = filter_string.rstrip('*')
+        if ('*' in body) or ('?' in body) or ('[' in body):
+            self.prefix = None
+            self.prog = re.compile(fnmatch.translate(filter_string))
+        else:
+            self.prefix = body
+            self.prog = None
+
+    def match(self,key):
+        if None != self.prefix:
+            return key.startswith(self.prefix)
+        return None != self.prog.match(key)
 
 def prepare_filter(filter_string):
-    # auto wildcard at end
-    if (0 == len(filter_string)) or ('*' != filter_string[-1]):
-        filter_string = filter_string + '*'
-    filter_string = filter_string.replace('*','.*')
-    return re.compile(filter_string)
+    f = filter_cache.get(filter_string)
+    if None == f:
+        f = filter_cache[filter_string] = Filter(filter_string)
+        if FILTER_CACHE_MAX < len(filter_cache):
+            filter_cache.popitem(last=False)
+    else:
+        filter_cache.move_to_end(filter_string)
+    return f
 
 #################################
 # print to STDOUT or file
+#   files are written through a large buffer,
+#   a '.gz' file name writes gzip-compressed output
+#
+
+OUTPUT_BUFFER=1024*1024
 
 output_file=''
-output_fd=None
+output_fd=sys.stdout
+
+# A buffered text file, gzip-compressed for a '.gz' name
+def open_output(file):
+    if file.endswith('.gz'):
+        return io.TextIOWrapper(io.BufferedWriter(gzip.GzipFile(file,'wb'),OUTPUT_BUFFER))
+    return open(file, 'w', buffering=OUTPUT_BUFFER)
 
 def output_file_action(action,file):
     global output_file,output_fd
@@ -161,52 +277,276 @@ def output_file_action(action,file):
         if "open" == action:
             output_file=file
             try:
-                output_fd=open(output_file, 'w')
+                output_fd=open_output(output_file)
             except:
                 print("\nERROR: Could not open file '%s'\n" % output_file)
                 return False
         if "close" == action:
             output_fd.close()
             print("\nDone: file '%s' created" % output_file)
-            output_fd=None
+            output_fd=sys.stdout
     else:
         output_file=''
-        output_fd=None
+        output_fd=sys.stdout
     return True
 
-def event_print(line,end=' '):
-    if '' == output_file:
-        if '' == end:
-            print(line,end='')
-        else:
-            print(line)
-    else:
-        if '' == end:
-            print(line,end='',file=output_fd)
+def event_print(line,end='\n'):
+    output_fd.write(line+end)
+
+#################################
+# profiling
+#   'with phase(name) as p:' records the wall time, the SQL statement
+#   count, the peak memory and 'p.rows' of a step, nested phases are
+#   shown indented under their parent
+#   the peak memory is the phase's traced peak when tracemalloc runs
+#   (with a dump), else the process's peak RSS at the end of the phase
+#   when profiling is off, phase() returns a shared do-nothing phase and
+#   the SQL trace callback is not installed
+#   a dump writes 'prefix.prof' (cProfile, for pstats or snakeviz)
+#   and 'prefix.malloc.txt' (the top tracemalloc allocation sites)
+#
+
+PROFILE_MALLOC_TOP=25   # allocation sites in the tracemalloc dump
+
+profiling=False
+profile_phases=[]       # the recorded phases, in start order
+profile_stack=[]        # the open phases
+profile_sql=0           # SQL statements run on the database connection
+profile_dump=''         # dump file prefix, '' for none
+profiler=None
+
+class NoPhase:
+    rows = None
+    def __enter__(self):
+        return self
+    def __exit__(self,*exc):
+        return False
+
+NO_PHASE=NoPhase()
+
+class ProfilePhase:
+    def __init__(self,name):
+        self.name = name
+        self.depth = len(profile_stack)
+        self.rows = None
+        self.wall = 0.0
+        self.sql = 0
+        self.peak = 0
+        self.traced = False
+
+    def __enter__(self):
+        if tracemalloc.is_tracing():
+            if profile_stack:
+                parent = profile_stack[-1]
+                parent.peak = max(parent.peak,tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        profile_phases.append(self)
+        profile_stack.append(self)
+        self.sql = profile_sql
+        self.wall = time.perf_counter()
+        return self
+
+    def __exit__(self,*exc):
+        self.wall = time.perf_counter() - self.wall
+        self.sql = profile_sql - self.sql
+        profile_stack.pop()
+        if tracemalloc.is_tracing():
+            self.traced = True
+            self.peak = max(self.peak,tracemalloc.get_traced_memory()[1])
+            if profile_stack:
+                profile_stack[-1].peak = max(profile_stack[-1].peak,self.peak)
+            tracemalloc.reset_peak()
         else:
-            print(line,file=output_fd)
-            
+            self.peak = peak_rss()
+        return False
+
+def phase(name):
+    if not profiling:
+        return NO_PHASE
+    return ProfilePhase(name)
+
+# The process's peak RSS in bytes, 0 where it is not known
+def peak_rss():
+    if None == resource:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if 'darwin' == sys.platform else peak * 1024
+
+def profile_trace(statement):
+    global profile_sql
+    profile_sql += 1
+
+def profile_start(dump=''):
+    global profiling,profile_dump,profiler
+    profiling = True
+    if None != conn:
+        conn.set_trace_callback(profile_trace)
+    if dump and not profile_dump:
+        profile_dump = dump
+        tracemalloc.start()
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+def profile_stop():
+    global profiling,profile_dump,profiler
+    profiling = False
+    try:
+        conn.set_trace_callback(None)
+    except (AttributeError,sqlite3.ProgrammingError):
+        pass    # no database, or it is closed
+    if profile_dump:
+        profiler.disable()
+        profiler.dump_stats(profile_dump + '.prof')
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        with open(profile_dump + '.malloc.txt','w') as fd:
+            for stat in snapshot.statistics('lineno')[:PROFILE_MALLOC_TOP]:
+                fd.write('%s\n' % stat)
+        print("Profile dump: '%s.prof', '%s.malloc.txt'" % (profile_dump,profile_dump))
+        profile_dump = ''
+        profiler = None
+
+# Print and forget the recorded phases
+def show_profile(file=None):
+    print('Profile:',file=file)
+    print('  %-40s %9s %9s %6s %9s' % ('Phase','Wall(s)','Rows','SQL','Peak(MB)'),file=file)
+    for p in profile_phases:
+        print('  %-40s %9.3f %9s %6d %9.1f%s' % ('  ' * p.depth + p.name,p.wall,
+            '' if None == p.rows else p.rows,p.sql,p.peak / (1024*1024),'*' if p.traced else ''),file=file)
+    if not profile_phases:
+        print('  No profiled phases, enable with \'p on\' or --profile',file=file)
+    elif any(p.traced for p in profile_phases):
+        print('  * the traced peak (tracemalloc), else the process peak RSS',file=file)
+    del profile_phases[:]
+
+# Decorator for a report function, a phase named after it
+def profiled(function):
+    def run(*args,**kwargs):
+        if not profiling:
+            return function(*args,**kwargs)
+        with phase(function.__name__):
+            return function(*args,**kwargs)
+    run.__name__ = function.__name__
+    return run
+
 #################################
 # connect to database
+#   the access modes:
+#     rw       : a 'mode=rw' URI, so that a missing file is an error
+#                and not a new empty database
+#     ro       : a 'mode=ro' URI, with query_only set
+#     immutable: also 'immutable=1', SQLite takes no locks and assumes
+#                that nothing writes the file (not for a live build)
+#     snapshot : the tables that this script reads are copied, in one
+#                read transaction, into an in-memory database
+#   every connection gets the mmap_size and cache_size pragmas, so large
+#   loads read the pages through the memory map, and the rows come
+#   in fetchmany() batches (see fetch_rows)
 #
 
-def connect_database(filename):
-    global database_file,conn
-    global build_cursor,project_cursor,target_cursor
+DB_ACCESS_MODES=('rw','ro','immutable','snapshot')
+DB_MMAP_SIZE=1024*1024*1024   # bytes of the database file to memory map, 0 to disable
+DB_CACHE_SIZE=-64*1024        # page cache, in KiB when negative
+FETCH_BATCH=5000              # rows per fetchmany()
+SNAPSHOT_TABLES=('orm_build','orm_project','orm_target','orm_recipe','orm_task','orm_task_dependency')
+
+def connect_database(filename,access='rw'):
+    global database_file,database_access,database_readonly,conn
+    global build_cursor,catalog_checked
 
     database_file = filename
-    conn = sqlite3.connect(database_file)
-    if None == conn:
-        print("ERROR: %s is not an sqlite database" % database_file)
+    database_access = access
+    database_readonly = 'rw' != access
+    catalog_checked = False
+    orm_columns.clear()
+    build_lru.clear()
+    cache_close()
+    try:
+        if 'rw' == access:
+            conn = sqlite3.connect(database_uri(database_file,'rw'),uri=True)
+        elif 'snapshot' == access:
+            with phase('snapshot'):
+                conn = snapshot_database(database_file)
+        else:
+            conn = sqlite3.connect(readonly_uri(database_file,'immutable' == access),uri=True)
+        conn.execute("PRAGMA mmap_size=%d" % DB_MMAP_SIZE)
+        conn.execute("PRAGMA cache_size=%d" % DB_CACHE_SIZE)
+        if database_readonly:
+            conn.execute("PRAGMA query_only=ON")
+    except sqlite3.Error as e:
+        print("ERROR: Could not open the database '%s' (%s)" % (database_file,e))
         sys.exit(1)
     build_cursor = conn.cursor()
-    project_cursor = conn.cursor()
-    target_cursor = conn.cursor()
+    if profiling:
+        conn.set_trace_callback(profile_trace)
+    try:
+        has_builds = bool(orm_table_columns('orm_build'))
+    except sqlite3.Error as e:
+        print("ERROR: '%s' is not an sqlite database (%s)" % (database_file,e))
+        sys.exit(1)
+    if not has_builds:
+        print("ERROR: '%s' is not a Toaster database, it has no orm_build table" % database_file)
+        sys.exit(1)
+
+# 'file:' URI that opens an existing sqlite database
+def database_uri(filename,mode):
+    return 'file:%s?mode=%s' % (pathname2url(os.path.abspath(filename)),mode)
+
+# 'file:' URI that opens an sqlite database read-only
+def readonly_uri(filename,immutable=False):
+    return database_uri(filename,'ro') + ('&immutable=1' if immutable else '')
+
+# In-memory copy of the tables that this script reads, with their indexes
+#   (the backup API would copy every page, and most of a Toaster
+#   database is in tables like orm_variable that are never read)
+def snapshot_database(filename):
+    print("Snapshot of '%s' in memory" % filename,file=sys.stderr)
+    memory = sqlite3.connect(':memory:')
+    memory.execute("ATTACH DATABASE ? AS source",(readonly_uri(filename),))
+    memory.execute("PRAGMA source.mmap_size=%d" % DB_MMAP_SIZE)
+    memory.execute("BEGIN")
+    schema = memory.execute("SELECT type, tbl_name, sql FROM source.sqlite_master"
+        " WHERE type IN ('table','index') AND sql IS NOT NULL").fetchall()
+    for kind,table,sql in sorted(schema,key=lambda s: 'index' == s[0]):
+        if not table in SNAPSHOT_TABLES:
+            continue
+        memory.execute(sql)
+        if 'table' == kind:
+            memory.execute('INSERT INTO main."%s" SELECT * FROM source."%s"' % (table,table))
+    memory.execute("COMMIT")
+    memory.execute("DETACH DATABASE source")
+    return memory
+
+# The cursor's rows, read in FETCH_BATCH batches
+def fetch_rows(cursor):
+    while True:
+        rows = cursor.fetchmany(FETCH_BATCH)
+        if not rows:
+            return
+        yield from rows
 
 #################################
-# show build list from database
+# build catalog
+#   the build list comes from one query that joins each build with
+#   its project and (first) target, instead of two lookups per build
+#   the builds can be filtered by outcome, project and completion
+#   date, sorted, and paged, and each line prints as its row arrives
+#   the catalog never writes the database (Toaster may be writing
+#   it): it notes once when the indexes that its joins need are
+#   missing, and runs without them, 'prepare' creates them
 #
 
+CATALOG_SORT={
+    'id':        'b.%(build_id)s',
+    'completed': 'b.%(completed_on)s',
+    'started':   'b.%(started_on)s',
+    'outcome':   'b.%(outcome)s',
+    'project':   'project',
+}
+CATALOG_OPTIONS=('outcome','project','since','until','sort','limit','offset')
+
+catalog_checked=False
+
 def build_outcome(x):
     return {
         '0': 'SUCCEEDED',
@@ -215,196 +555,1514 @@ def build_outcome(x):
         '3': 'CANCELLED',
     }[x]
 
-def fetch_build_metadata(build):
-    global build_data
+def outcome_code(name):
+    for code in ('0','1','2','3'):
+        if build_outcome(code).startswith(name.upper()):
+            return int(code)
+    return None
+
+def catalog_indexes():
+    global catalog_checked
+    if catalog_checked:
+        return
+    catalog_checked = True
+    missing = [index_name(table,key,more) for table,key,more,found in check_indexes(CATALOG_INDEXES)
+        if None == found]
+    if missing:
+        print("NOTE: the build list runs without the indexes %s, "
+            "use 'prepare --copy FILE' or 'prepare --in-place' to create them" % ', '.join(missing),file=sys.stderr)
+
+# 'YYYY-MM-DD[THH:MM:SS]' as Toaster's date text, a day 'until' is inclusive
+def catalog_date(text,until=False):
+    when = datetime.fromisoformat(text)
+    if until and (10 >= len(text)):
+        when += timedelta(days=1)
+    return str(when)
+
+def catalog_query(outcome=None,project=None,since=None,until=None,sort='id',limit=None,offset=0,build_id=None):
+    names = {
+        'build_id':orm_column('orm_build',BUILD_ORM_ID),
+        'machine':orm_column('orm_build',BUILD_ORM_MACHINE),
+        'started_on':orm_column('orm_build',BUILD_ORM_STARTED_ON),
+        'completed_on':orm_column('orm_build',BUILD_ORM_COMPLETED_ON),
+        'outcome':orm_column('orm_build',BUILD_ORM_OUTCOME),
+        'project_id':orm_column('orm_build',BUILD_ORM_PROJECT_ID),
+        'project_key':orm_column('orm_project',PROJECT_ORM_ID),
+        'project_name':orm_column('orm_project',PROJECT_ORM_NAME),
+        'target_id':orm_column('orm_target',TARGET_ORM_ID),
+        'target':orm_column('orm_target',TARGET_ORM_TARGET),
+        'task':orm_column('orm_target',TARGET_ORM_TASK),
+        'target_build':orm_column('orm_target',TARGET_ORM_BUILD_ID),
+    }
+    query = ("SELECT b.%(build_id)s, b.%(machine)s, b.%(started_on)s, b.%(completed_on)s, b.%(outcome)s,"
+             " coalesce(p.%(project_name)s,?) AS project,"
+             " coalesce(t.%(target)s,?), coalesce(t.%(task)s,?)"
+             " FROM orm_build b"
+             " LEFT JOIN orm_project p ON p.%(project_key)s = b.%(project_id)s"
+             " LEFT JOIN orm_target t ON t.%(target_id)s ="
+             " (SELECT min(%(target_id)s) FROM orm_target WHERE %(target_build)s = b.%(build_id)s)" % names)
+    values = [COMMAND_LINE_PROJ,NO_TARGET,NO_TASK]
+    where = []
+    if None != build_id:
+        where.append("b.%(build_id)s = ?" % names)
+        values.append(build_id)
+    if None != outcome:
+        where.append("b.%(outcome)s = ?" % names)
+        values.append(outcome)
+    if None != project:
+        # the same patterns as the task filters, with the automatic wild card
+        where.append("coalesce(p.%(project_name)s,?) GLOB ?" % names)
+        values += [COMMAND_LINE_PROJ,prepare_filter(project).pattern]
+    if None != since:
+        where.append("b.%(completed_on)s >= ?" % names)
+        values.append(since)
+    if None != until:
+        where.append("b.%(completed_on)s < ?" % names)
+        values.append(until)
+    if where:
+        query += " WHERE " + " AND ".join(where)
+    order = CATALOG_SORT[sort.lstrip('-')] % names
+    query += " ORDER BY %s%s, b.%s" % (order,' DESC' if sort.startswith('-') else '',names['build_id'])
+    if None != limit:
+        query += " LIMIT %d OFFSET %d" % (limit,offset)
+    return query,values
+
+def build_metadata(row):
     build_data={}
-    # read this build's meta information
-    build_data['id']=build[BUILD_ORM_ID]
-    build_data['machine']=build[BUILD_ORM_MACHINE]
-    build_data['started_on']=build[BUILD_ORM_STARTED_ON]
-    build_data['completed_on']=build[BUILD_ORM_COMPLETED_ON]
-    build_data['outcome']=build[BUILD_ORM_OUTCOME]
-    project_id=build[BUILD_ORM_PROJECT_ID]
-    # look up this build's project name
-    project_cursor.execute("SELECT * FROM orm_project where id = '%s'" % project_id)
-    project = project_cursor.fetchone()
-    if None == project:
-        build_data['project'] = COMMAND_LINE_PROJ
-    else:
-        build_data['project']=project[PROJECT_ORM_NAME]
-    # look up this build's target information
-    target_cursor.execute("SELECT * FROM orm_target where build_id = '%s'" % build[BUILD_ORM_ID])
-    target = target_cursor.fetchone()
-    if None == target:
-        build_data['target']=NO_TARGET
-        build_data['task']=NO_TASK
-    else:
-        build_data['target']=target[TARGET_ORM_TARGET]
-        build_data['task']=target[TARGET_ORM_TASK]
+    (build_data['id'],build_data['machine'],build_data['started_on'],build_data['completed_on'],
+        build_data['outcome'],build_data['project'],build_data['target'],build_data['task']) = row
+    return build_data
 
-def show_builds():
+def fetch_build_metadata(build):
+    c = conn.cursor()
+    c.execute(*catalog_query(build_id=build[BUILD_ORM_ID]))
+    return build_metadata(c.fetchone())
+
+# 'key=value' catalog options, None for an unknown option or value
+def catalog_options(args):
+    options = {}
+    for arg in args:
+        key,_,value = arg.partition('=')
+        if not key in CATALOG_OPTIONS:
+            print("ERROR: Unknown build list option '%s', use %s" % (key,'|'.join(CATALOG_OPTIONS)))
+            return None
+        if key in ('limit','offset'):
+            if not value.isdigit():
+                print("ERROR: Use '%s=<number>'" % key)
+                return None
+            value = int(value)
+        options[key] = value
+    return options
+
+@profiled
+def show_builds(outcome=None,project=None,since=None,until=None,sort='id',limit=None,offset=0):
+    try:
+        if None != outcome:
+            code = outcome_code(outcome)
+            if None == code:
+                print("ERROR: Unknown outcome '%s'" % outcome)
+                return False
+            outcome = code
+        if None != since:
+            since = catalog_date(since)
+        if None != until:
+            until = catalog_date(until,True)
+    except ValueError as e:
+        print("ERROR: Unknown date (%s), use 'YYYY-MM-DD' or 'YYYY-MM-DDTHH:MM:SS'" % e)
+        return False
+    if not sort.lstrip('-') in CATALOG_SORT:
+        print("ERROR: Unknown sort '%s', use [-]%s" % (sort,'|'.join(CATALOG_SORT)))
+        return False
+
+    catalog_indexes()
+    # one extra row tells if there is a next page
+    query,values = catalog_query(outcome,project,since,until,sort,
+        None if None == limit else limit + 1,offset)
+    c = conn.cursor()
+    c.execute(query,values)
     print("List of available builds:")
-    build_cursor.execute("SELECT * FROM orm_build")
-    build = build_cursor.fetchone()
-    while build != None:
-        fetch_build_metadata(build)
-        print("  BuildId=%s) CompletedOn=%s, Outcome=%s, Project=%s, Target=%s, Task=%s" %
-            (build_data['id'],build_data['completed_on'],build_outcome(str(build_data['outcome'])),
-            build_data['project'],build_data['target'],build_data['task']) )
-        build = build_cursor.fetchone()
-    return ""
+    shown = 0
+    for row in fetch_rows(c):
+        if shown == limit:
+            print("  ... more builds, use offset=%d" % (offset + limit))
+            break
+        build_data = build_metadata(row)
+        print("  %sBuildId=%s) CompletedOn=%s, Outcome=%s, Project=%s, Target=%s, Task=%s" %
+            ('*' if build_data['id'] in build_lru else ' ',
+            build_data['id'],build_data['completed_on'],build_outcome(str(build_data['outcome'])),
+            build_data['project'],build_data['target'],build_data['task']), flush=True)
+        shown += 1
+    return True
 
 #################################
-# Fetch build data from database
+# compute execution overlaps
+#   two spans overlap when (start_a < stop_b) and (stop_a > start_b)
+#   sweep-line: sort the start/stop events once, then walk them
+#     with the set of active spans, O(n log n + k) for k overlaps
+#   returns each span's overlap index list, in span order
 #
 
-def fetch_build_data(build_id):
-    global build
-    global taskList, recipeList, taskTimeList, recipeTimeList
-    global recipe_length_max, task_length_max, task_execute_max, recipe_execute_max
-
-    taskList = []
-    recipeList = []
-    taskTimeList = []
-    recipeTimeList = []
-    recipe_length_max = 0
-    task_length_max = 0
-    max_records = RECORD_MAX
+SWEEP_STOP=0    # at equal times: stops, then points, then starts
+SWEEP_POINT=1
+SWEEP_START=2
 
-    print("Fetching build #%d" % build_id)
+def compute_overlaps(spans):
+    overlaps = [[] for i in range(len(spans))]
+    events = []
+    for i,(start,stop) in enumerate(spans):
+        if (start != start) or (stop != stop):
+            # a missing (NaN) time never overlaps
+            continue
+        if start < stop:
+            events.append( (start,SWEEP_START,i) )
+            events.append( (stop ,SWEEP_STOP ,i) )
+        else:
+            # empty (or reversed) span, e.g. cached tasks ('None','None')
+            # it can only overlap a span that strictly contains it
+            events.append( (start,SWEEP_POINT,i) )
+    events.sort()
+
+    active = set()
+    for t,state,i in events:
+        if SWEEP_STOP == state:
+            active.discard(i)
+        elif SWEEP_POINT == state:
+            stop = spans[i][1]
+            for j in active:
+                if spans[j][0] < stop:
+                    overlaps[i].append(j)
+                    overlaps[j].append(i)
+        else:
+            for j in active:
+                overlaps[i].append(j)
+                overlaps[j].append(i)
+            active.add(i)
+
+    # present each list in span order, as the pairwise scan did
+    for o in overlaps:
+        o.sort()
+    return overlaps
+
+# Counts only, same sweep without collecting the pairs
+#   a span's count is the starts seen before its stop, less the stops
+#   seen before its start, plus the empty spans seen in between
+def count_overlaps(spans):
+    counts = [0] * len(spans)
+    events = []
+    for i,(start,stop) in enumerate(spans):
+        if (start != start) or (stop != stop):
+            continue
+        if start < stop:
+            events.append( (start,SWEEP_START,i) )
+            events.append( (stop ,SWEEP_STOP ,i) )
+        else:
+            events.append( (start,SWEEP_POINT,i) )
+    events.sort()
+
+    active = set()
+    started = stopped = points = 0
+    for t,state,i in events:
+        if SWEEP_STOP == state:
+            active.discard(i)
+            stopped += 1
+            counts[i] += started - 1 + points
+        elif SWEEP_POINT == state:
+            stop = spans[i][1]
+            if t == stop:
+                counts[i] = len(active)
+                points += 1
+            else:
+                # reversed spans are rare, match them one by one
+                for j in active:
+                    if spans[j][0] < stop:
+                        counts[i] += 1
+                        counts[j] += 1
+        else:
+            counts[i] -= stopped + points
+            active.add(i)
+            started += 1
+    return counts
+
+# Reference pairwise scan, kept to validate compute_overlaps
+def compute_overlaps_pairwise(spans):
+    overlaps = [[] for i in range(len(spans))]
+    for i,(start,stop) in enumerate(spans):
+        for j,(start2,stop2) in enumerate(spans):
+            if i != j:
+                if (start < stop2) and (stop > start2):
+                    overlaps[i].append(j)
+    return overlaps
+
+# Compare the sweep against the pairwise scan on synthetic builds
+#   integer times force many shared start/stop ticks
+#   'None' times mimic the cached tasks of an old string build, and
+#   the float spans are what load_build passes: NaN for a missing time,
+#   including a start with no stop (a task still running)
+def selftest_overlaps(trials=200,seed=1):
+    import random
+    rnd = random.Random(seed)
+    for trial in range(trials):
+        spans = []
+        for i in range(rnd.randint(0,60)):
+            if 0 == rnd.randrange(10):
+                spans.append( ('None','None') )
+                continue
+            start = rnd.randint(0,100)
+            stop = start + rnd.choice( (0,1,1,5,10,30,-3) )
+            spans.append( ('%04d' % start,'%04d' % stop) )
+        times = [(NO_TIME if 'None' == start else float(start),NO_TIME if 'None' == stop else float(stop))
+            for start,stop in spans]
+        if not selftest_spans('string',trial,spans,times):
+            return False
+
+        spans = []
+        for i in range(rnd.randint(0,60)):
+            start = rnd.randint(0,100) + rnd.choice( (0.0,0.5,rnd.random()) )
+            stop = start + rnd.choice( (0.0,0.5,1.0,5.0,10.0,30.0,-3.0,rnd.random()) )
+            kind = rnd.randrange(20)
+            if 0 == kind:
+                start = stop = NO_TIME
+            elif 1 == kind:
+                stop = NO_TIME
+            elif 2 == kind:
+                start = NO_TIME
+            spans.append( (start,stop) )
+        if not selftest_spans('float',trial,spans,spans):
+            return False
+    # two reversed spans first: their start counts are -1 and 0
+    if not selftest_spans('reversed',trials,[(10.0,5.0),(11.0,4.0),(12.0,20.0)],[(10.0,5.0),(11.0,4.0),(12.0,20.0)]):
+        return False
+    print("Success: overlap sweep, index and events match the pairwise scan for %d synthetic builds" % (2 * trials + 1))
+    return True
 
-    build_cursor.execute("SELECT * FROM orm_build where id = '%s'" % build_id)
-    build=build_cursor.fetchone()
-    fetch_build_metadata(build)
+# Check the sweep, the counts and the interval index of spans
+#   times are the spans as floats, for the span table
+def selftest_spans(kind,trial,spans,times):
+    overlaps = compute_overlaps_pairwise(spans)
+    if compute_overlaps(spans) != overlaps:
+        print("FAIL: %s overlap sweep mismatch, trial=%d, spans=%s" % (kind,trial,spans))
+        return False
+    if count_overlaps(spans) != [len(o) for o in overlaps]:
+        print("FAIL: %s overlap count mismatch, trial=%d, spans=%s" % (kind,trial,spans))
+        return False
+    # the on demand lists, from the interval index
+    table = SpanTable([])
+    for start,stop in times:
+        table.append(0,start,stop,0)
+    if [list(table.overlaps(i)) for i in range(len(table))] != overlaps:
+        print("FAIL: %s overlap index mismatch, trial=%d, spans=%s" % (kind,trial,spans))
+        return False
+    # the time events and their histogram, the reversed spans give negative counts
+    events,execute_max = build_events_python(table)
+    counts = events.start_counts()
+    hist = histogram_python(counts)
+    if (sum(hist) != len(counts)) or (min(hist[1:] + [1]) < 0):
+        print("FAIL: %s histogram mismatch, trial=%d, spans=%s" % (kind,trial,spans))
+        return False
+    if (None != numpy) and (0 < len(table)):
+        events_numpy,execute_max_numpy = build_events_numpy(table)
+        if ((events.state,events.count,events.row_id,execute_max) !=
+                (events_numpy.state,events_numpy.count,events_numpy.row_id,execute_max_numpy)) or \
+                (histogram(events_numpy.start_counts()) != hist):
+            print("FAIL: %s NumPy events or histogram mismatch, trial=%d, spans=%s" % (kind,trial,spans))
+            return False
+    return True
 
-    c = conn.cursor()
-    d = conn.cursor()
+#################################
+# task times
+#   Toaster stores times as 'YYYY-MM-DD HH:MM:SS.ffffff' text,
+#   the span tables keep them as float64 seconds (UTC),
+#   with NaN for a missing time (e.g. cached tasks)
+#
 
-    # Fetch the build's tasks from the database
-    c.execute("SELECT * FROM orm_task where build_id = '%s'" % build_id)
-    task = c.fetchone()
-    if None == task:
-        build=None
-        print("ERROR: No build or tasks found for this build id!")
-        return False
+NO_TIME=float('nan')
+
+def time_value(text):
+    if None == text:
+        return NO_TIME
+    if isinstance(text,(int,float)):
+        return float(text)
+    when = datetime.fromisoformat(text)
+    if None == when.tzinfo:
+        when = when.replace(tzinfo=timezone.utc)
+    return when.timestamp()
+
+def time_text(value):
+    if isnan(value):
+        return 'None'
+    return str(datetime.fromtimestamp(value,timezone.utc).replace(tzinfo=None))
+
+# sort key that places missing times last, as the 'None' text did
+def time_order(value):
+    if isnan(value):
+        return (1,0.0)
+    return (0,value)
 
-    while None != task:
-        # fetch the task's parent recipe name
-        d.execute("SELECT * FROM orm_recipe where id = '%s'" % task[TASK_ORM_RECIPE_ID])
-        recipe = d.fetchone()
-
-        # get maximum string lengths
-        if recipe_length_max < len(recipe[RECIPE_ORM_NAME]):
-            recipe_length_max = len(recipe[RECIPE_ORM_NAME])
-        if task_length_max < len(task[TASK_ORM_NAME]):
-            task_length_max = len(task[TASK_ORM_NAME])
-
-        # Fix time data for cached builds (time == None)
-        task_start = task[TASK_ORM_START];
-        if task_start == None:
-            task_start = 'None'
-        task_stop = task[TASK_ORM_STOP];
-        if task_stop == None:
-            task_stop = 'None'
-
-        # Add the taskList entry
-        taskList.append( [recipe[RECIPE_ORM_NAME],task[TASK_ORM_NAME],task_start, task_stop, 0, [] ])
-
-        # Append the Task time start and stop entires
-        taskTimeList.append( [START,0, task_start,recipe[RECIPE_ORM_NAME],task[TASK_ORM_NAME]] )
-        taskTimeList.append( [STOP ,0, task_stop ,recipe[RECIPE_ORM_NAME],task[TASK_ORM_NAME]] )
-
-        # Set the recipe time span
-        for r in recipeList:
-            # set the recipe's stop time from its last task
-            if recipe[RECIPE_ORM_NAME] == r[RECIPE_NAME]:
-                if r[RECIPE_STOP] < task_stop:
-                    r[RECIPE_STOP] = task_stop
-                break
-        else:
-            # first task for this recipe, set the recipe start time
-            recipeList.append( [recipe[RECIPE_ORM_NAME], task_start, task_stop, 0, [] ])
-
-        # Loop
-        if None == max_records:
-            task = c.fetchone()
-        elif max_records > 0:
-            max_records -= 1
-            task = c.fetchone()
+#################################
+# columnar span and event tables
+#   taskList and recipeList are SpanTable objects, one row per task
+#   (or recipe): name ids into the build's interned string table,
+#   float64 start/stop arrays and the overlap counts
+#   the overlap lists are found on demand, from a range query on the
+#   table's interval index (see SpanIndex), and memoized; with
+#   OVERLAPS_EAGER they are all computed at load time instead, as CSR
+#   index arrays where the overlaps of row i are
+#   over_idx[over_ptr[i]:over_ptr[i+1]]
+#   taskTimeList and recipeTimeList are EventTable objects, one row
+#   per start/stop event pointing back to its span row
+#
+
+class SpanTable:
+    def __init__(self,names,has_task=True):
+        self.names = names
+        self.recipe = array('i')
+        self.task = array('i') if has_task else None
+        self.start = array('d')
+        self.stop = array('d')
+        self.count = array('i')
+        self.over_ptr = None
+        self.over_idx = None
+        self.clear_derived()
+
+    # the lookups derived from the rows, rebuilt on demand
+    #   (call it after changing the rows)
+    def clear_derived(self):
+        self.index = None                # interval index
+        self.over_memo = {}              # row -> overlap rows
+        self.key_column = None           # row -> 'recipe:task' key
+        self.key_order = None            # rows by key
+        self.sorted_keys = None          # keys by key, for bisect
+        self.filter_memo = OrderedDict() # filter pattern -> rows
+
+    def __len__(self):
+        return len(self.start)
+
+    def append(self,recipe,start,stop,task=None):
+        self.recipe.append(recipe)
+        if None != self.task:
+            self.task.append(task)
+        self.start.append(start)
+        self.stop.append(stop)
+
+    def set_overlaps(self,overlaps):
+        self.over_ptr = array('q',[0])
+        self.over_idx = array('i')
+        for o in overlaps:
+            self.count.append(len(o))
+            self.over_idx.extend(o)
+            self.over_ptr.append(len(self.over_idx))
+
+    # counts only, the overlap lists are found on demand
+    def set_counts(self,counts):
+        self.count.extend(counts)
+
+    def has_overlaps(self):
+        return None != self.over_ptr
+
+    # the interval index, built on the first query
+    def span_index(self):
+        if None == self.index:
+            with phase('span index') as p:
+                self.index = SpanIndex(self)
+                p.rows = len(self)
+        return self.index
+
+    # the derived lookups are never pickled
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for name in ('index','over_memo','key_column','key_order','sorted_keys','filter_memo'):
+            del state[name]
+        return state
+
+    def __setstate__(self,state):
+        self.__dict__.update(state)
+        self.clear_derived()
+
+    # the rows whose key matches the filter, in table order
+    #   a prefix pattern bisects the sorted keys, the others scan the
+    #   key column; the row sets of recent patterns are memoized
+    def filter_rows(self,filter_string):
+        f = prepare_filter(filter_string)
+        rows = self.filter_memo.get(f.pattern)
+        if None != rows:
+            self.filter_memo.move_to_end(f.pattern)
+            return rows
+        keys = self.keys()
+        if '' == f.prefix:
+            rows = array('i',range(len(keys)))
+        elif None != f.prefix:
+            if None == self.key_order:
+                self.key_order = sorted(range(len(keys)),key=keys.__getitem__)
+                self.sorted_keys = [keys[i] for i in self.key_order]
+            first = last = bisect.bisect_left(self.sorted_keys,f.prefix)
+            while (last < len(keys)) and self.sorted_keys[last].startswith(f.prefix):
+                last += 1
+            rows = array('i',sorted(self.key_order[first:last]))
         else:
-            task = None
-
-    # Compute the overlapping tasks
-    for t in taskList:
-        for tt in taskList:
-            if t != tt:
-                if (t[TASK_START] < tt[TASK_STOP]) and (t[TASK_STOP] > tt[TASK_START]):
-                    t[TASK_OVERLIST].append(tt[TASK_RECIPE]+':'+tt[TASK_NAME])
-                    t[TASK_OVERCOUNT] += 1
-
-    # Compute the overlapping recipes (over the span of the recipe's tasks)
-    for r in recipeList:
-        # append the Recipe time start and stop entires
-        recipeTimeList.append( [START,0,r[RECIPE_START],r[RECIPE_NAME],''] )
-        recipeTimeList.append( [STOP ,0,r[RECIPE_STOP] ,r[RECIPE_NAME],''] )
-        for rr in recipeList:
-            if r != rr:
-                if (r[RECIPE_START] < rr[RECIPE_STOP]) and (r[RECIPE_STOP] > rr[RECIPE_START]):
-                    r[RECIPE_OVERLIST].append(rr[RECIPE_NAME])
-                    r[RECIPE_OVERCOUNT] += 1
-
-    # sort the lists
-    taskList.sort(key=lambda item: item[TASK_START])
-    taskList.sort(key=lambda item: item[TASK_RECIPE])
-    recipeList.sort(key=lambda item: item[RECIPE_NAME])
-    taskTimeList.sort(key=lambda item: item[TIME_TIME])
-    recipeTimeList.sort(key=lambda item: item[TIME_TIME])
-
-    # count the task's max thread parallelism
+            match = f.prog.match
+            rows = array('i',(i for i,key in enumerate(keys) if match(key)))
+        self.filter_memo[f.pattern] = rows
+        if FILTER_CACHE_MAX < len(self.filter_memo):
+            self.filter_memo.popitem(last=False)
+        return rows
+
+    def recipe_name(self,i):
+        return self.names[self.recipe[i]]
+
+    def task_name(self,i):
+        if None == self.task:
+            return ''
+        return self.names[self.task[i]]
+
+    # 'recipe:task' for tasks, 'recipe' for recipes
+    def key(self,i):
+        return self.keys()[i]
+
+    # the key column, built once
+    def keys(self):
+        if None == self.key_column:
+            names = self.names
+            if None == self.task:
+                self.key_column = [names[recipe] for recipe in self.recipe]
+            else:
+                self.key_column = [names[recipe]+':'+names[task] for recipe,task in zip(self.recipe,self.task)]
+        return self.key_column
+
+    def overlaps(self,i):
+        if self.has_overlaps():
+            return self.over_idx[self.over_ptr[i]:self.over_ptr[i+1]]
+        overlaps = self.over_memo.get(i)
+        if None == overlaps:
+            overlaps = self.over_memo[i] = self.span_index().overlaps(i)
+        return overlaps
+
+    def overlap_names(self,i):
+        return [self.key(j) for j in self.overlaps(i)]
+
+    # the row as a [recipe,(task,)start,stop,count,overlaps] list, for display
+    def row(self,i):
+        row = [self.recipe_name(i)]
+        if None != self.task:
+            row.append(self.task_name(i))
+        row.extend( [time_text(self.start[i]),time_text(self.stop[i]),self.count[i],self.overlap_names(i)] )
+        return row
+
+class EventTable:
+    def __init__(self,spans):
+        self.spans = spans
+        self.state = array('b')
+        self.count = array('i')
+        self.row_id = array('i')
+
+    def __len__(self):
+        return len(self.state)
+
+    def time(self,i):
+        if START == self.state[i]:
+            return self.spans.start[self.row_id[i]]
+        return self.spans.stop[self.row_id[i]]
+
+    def key(self,i):
+        return self.spans.key(self.row_id[i])
+
+    # the max parallelism count of each start event
+    def start_counts(self):
+        if (None != numpy) and (0 < len(self)):
+            return numpy_view(self.count)[numpy_view(self.state) == START]
+        return [count for state,count in zip(self.state,self.count) if START == state]
+
+    # the event as a [state,count,time,recipe,task] list, for display
+    def row(self,i):
+        j = self.row_id[i]
+        return [self.state[i],self.count[i],time_text(self.time(i)),
+            self.spans.recipe_name(j),self.spans.task_name(j)]
+
+# Sort the start/stop events of a span table by time, and
+# count the running parallelism at each event
+#   returns the event table and the max parallelism
+def build_events(spans):
+    if (None != numpy) and (0 < len(spans)):
+        return build_events_numpy(spans)
+    return build_events_python(spans)
+
+def build_events_python(spans):
+    order = []
+    for i in range(len(spans)):
+        order.append( (START,i) )
+        order.append( (STOP ,i) )
+    order.sort(key=lambda e: time_order(spans.start[e[1]] if START == e[0] else spans.stop[e[1]]))
+
+    events = EventTable(spans)
     count=0
-    task_execute_max=0
-    for t in taskTimeList:
-        if START == t[TIME_STATE]:
+    execute_max=0
+    for state,i in order:
+        if START == state:
             count += 1;
-            if task_execute_max < count:
-                task_execute_max = count
+            if execute_max < count:
+                execute_max = count
         else:
             count -= 1;
-        t[TIME_OVERCOUNT] = count;
+        events.state.append(state)
+        events.count.append(count)
+        events.row_id.append(i)
+    return events,execute_max
+
+# NumPy path: a stable argsort of the interleaved start/stop times
+# (NaN sorts last), then a cumulative sum over the +1/-1 deltas
+def build_events_numpy(spans):
+    count = len(spans)
+    times = numpy.empty(2*count)
+    times[0::2] = numpy_view(spans.start)
+    times[1::2] = numpy_view(spans.stop)
+    state = numpy.empty(2*count,dtype=numpy.int8)
+    state[0::2] = START
+    state[1::2] = STOP
+    order = numpy.argsort(times,kind='stable')
+    state = state[order]
+    running = numpy.cumsum(numpy.where(START == state,1,-1))
+
+    events = EventTable(spans)
+    events.state.frombytes(state.tobytes())
+    events.count.frombytes(running.astype(events.count.typecode).tobytes())
+    events.row_id.frombytes((order // 2).astype(events.row_id.typecode).tobytes())
+    return events,max(0,int(running.max()))
+
+# Zero-copy NumPy view of an array.array column
+def numpy_view(column):
+    return numpy.frombuffer(column,dtype=column.typecode)
 
-    # count the recipe's max thread parallelism
-    count=0
-    recipe_execute_max=0
-    for t in recipeTimeList:
-        if START == t[TIME_STATE]:
-            count += 1;
-            if recipe_execute_max < count:
-                recipe_execute_max = count
+#################################
+# span interval index
+#   a centered interval tree over the timed rows of a span table,
+#   for the overlap lists and the 'at' and 'window' queries in O(log n + k)
+#   each node keeps the spans that contain its center, by start and
+#   by latest stop, the spans before it on the left, after it on the
+#   right; the centers are endpoint medians, so the tree is balanced
+#   spans are closed [start,stop], a reversed span is a point at start
+#
+
+class SpanIndex:
+    def __init__(self,spans):
+        self.spans = spans
+        self.stop = array('d',(max(start,stop) for start,stop in zip(spans.start,spans.stop)))
+        # the timed rows by start, for the window starts
+        self.order = sorted((i for i in range(len(spans)) if not isnan(spans.start[i])),
+            key=lambda i: spans.start[i])
+        self.starts = array('d',(spans.start[i] for i in self.order))
+        self.center = array('d')
+        self.left = array('i')
+        self.right = array('i')
+        self.by_start = []
+        self.by_stop = []
+        self.root = self.add_node(self.order)
+
+    # builds the subtree of the rows, returns its node or -1
+    def add_node(self,rows):
+        start = self.spans.start
+        stop = self.stop
+        root = -1
+        pending = [(rows,-1,None)]
+        while pending:
+            rows,parent,side = pending.pop()
+            if 0 == len(rows):
+                continue
+            endpoints = sorted([start[i] for i in rows] + [stop[i] for i in rows])
+            center = endpoints[len(endpoints) // 2]
+            node = len(self.center)
+            self.center.append(center)
+            self.left.append(-1)
+            self.right.append(-1)
+            here = [i for i in rows if (start[i] <= center) and (center <= stop[i])]
+            self.by_start.append(sorted(here,key=lambda i: start[i]))
+            self.by_stop.append(sorted(here,key=lambda i: stop[i],reverse=True))
+            if -1 == parent:
+                root = node
+            elif 'left' == side:
+                self.left[parent] = node
+            else:
+                self.right[parent] = node
+            pending.append( ([i for i in rows if stop[i] < center],node,'left') )
+            pending.append( ([i for i in rows if start[i] > center],node,'right') )
+        return root
+
+    # the rows running at time t, by start
+    def at(self,t):
+        start = self.spans.start
+        result = []
+        node = self.root
+        while -1 != node:
+            center = self.center[node]
+            if t < center:
+                for i in self.by_start[node]:
+                    if start[i] > t:
+                        break
+                    result.append(i)
+                node = self.left[node]
+            elif t > center:
+                for i in self.by_stop[node]:
+                    if self.stop[i] < t:
+                        break
+                    result.append(i)
+                node = self.right[node]
+            else:
+                result.extend(self.by_start[node])
+                break
+        result.sort(key=lambda i: start[i])
+        return result
+
+    # the rows running at any time from t1 to t2, by start:
+    # the ones running at t1, then the ones starting after it
+    def window(self,t1,t2):
+        first = bisect.bisect_right(self.starts,t1)
+        last = bisect.bisect_right(self.starts,t2)
+        return self.at(t1) + self.order[first:last]
+
+    # the rows that overlap row i, in table order, as compute_overlaps finds them:
+    #   the window over the span, less the spans that only touch it
+    def overlaps(self,i):
+        start = self.spans.start
+        stop = self.spans.stop
+        a = start[i]
+        b = stop[i]
+        if isnan(a) or isnan(b):
+            return array('i')
+        return array('i',sorted(j for j in self.window(min(a,b),max(a,b))
+            if (j != i) and (a < stop[j]) and (b > start[j])))
+
+#################################
+# per-build data set
+#   holds one build's tables and column statistics,
+#   so that several builds can be loaded at once
+#
+
+class BuildAnalysis:
+    # the computed members, in build cache order
+    COMPUTED = ('names','taskList','recipeList','taskTimeList','recipeTimeList',
+        'recipe_length_max','task_length_max','task_execute_max','recipe_execute_max')
+
+    def __init__(self,build,build_data):
+        self.build = build
+        self.build_data = build_data
+        self.cached = False   # True once the computed members are in the build cache
+        self.names = []
+        self.taskList = SpanTable(self.names)
+        self.recipeList = SpanTable(self.names,False)
+        self.taskTimeList = EventTable(self.taskList)
+        self.recipeTimeList = EventTable(self.recipeList)
+        # Statistics for displaying columns
+        self.recipe_length_max = 0
+        self.task_length_max = 0
+        self.task_execute_max = 0
+        self.recipe_execute_max = 0
+
+    def task_index(self):
+        return self.taskList.span_index()
+
+    def cache_data(self):
+        return tuple(getattr(self,name) for name in self.COMPUTED)
+
+    def restore(self,data):
+        for name,value in zip(self.COMPUTED,data):
+            setattr(self,name,value)
+
+    def is_in_progress(self):
+        return '2' == str(self.build_data['outcome'])
+
+#################################
+# loaded build LRU
+#   'b <id>' switches between loaded builds without reloading them
+#   bounded by the build count and by the total task count
+#   IN_PROGRESS builds are always reloaded
+#
+
+build_lru=OrderedDict()
+
+def build_lru_get(build_id):
+    bs = build_lru.get(build_id)
+    if None != bs:
+        build_lru.move_to_end(build_id)
+    return bs
+
+def build_lru_put(bs):
+    if bs.is_in_progress():
+        return
+    build_lru[bs.build_data['id']] = bs
+    build_lru.move_to_end(bs.build_data['id'])
+    tasks = sum(len(b.taskList) for b in build_lru.values())
+    while (1 < len(build_lru)) and ((BUILD_LRU_MAX < len(build_lru)) or (BUILD_LRU_TASKS_MAX < tasks)):
+        build_id,old = build_lru.popitem(last=False)
+        tasks -= len(old.taskList)
+
+#################################
+# persistent build cache
+#   a sidecar SQLite file next to the Toaster database holds the
+#   computed lists of each completed build, as a compressed '.npz'
+#   payload in the export layout, so that no code runs on loading
+#   entries are keyed by build id, completed_on and the database mtime
+#   an entry that does not decode is a miss, and is deleted
+#   IN_PROGRESS builds bypass the cache
+#   the least recently used entries are evicted past CACHE_SIZE_MAX
+#
+
+cache_conn=None
+cache_readonly=False   # set in the loader processes, only the main process writes
+
+def cache_open():
+    global cache_conn
+    if (None == cache_conn) and (0 < CACHE_SIZE_MAX):
+        try:
+            if cache_readonly:
+                if os.path.exists(database_file + CACHE_SUFFIX):
+                    cache_conn = sqlite3.connect(readonly_uri(database_file + CACHE_SUFFIX),uri=True)
+                return cache_conn
+            cache_conn = sqlite3.connect(database_file + CACHE_SUFFIX)
+            cache_conn.execute("CREATE TABLE IF NOT EXISTS build_cache ("
+                "build_id INTEGER PRIMARY KEY, completed_on TEXT, db_mtime REAL, "
+                "version INTEGER, size INTEGER, last_used REAL, payload BLOB)")
+        except sqlite3.Error as e:
+            print("NOTE: build cache disabled (%s)" % e)
+            cache_conn = None
+    return cache_conn
+
+def cache_close():
+    global cache_conn
+    if None != cache_conn:
+        cache_conn.close()
+        cache_conn = None
+
+def cache_key(build):
+    if (None == build) or ('2' == str(build[BUILD_ORM_OUTCOME])) or (None != RECORD_MAX):
+        return None
+    return (build[BUILD_ORM_ID],str(build[BUILD_ORM_COMPLETED_ON]),os.path.getmtime(database_file))
+
+def cache_load(build):
+    key = cache_key(build)
+    if (None == key) or (None == cache_open()):
+        return None
+    row = cache_conn.execute("SELECT payload FROM build_cache WHERE build_id = ? AND "
+        "completed_on = ? AND db_mtime = ? AND version = ?", key + (CACHE_VERSION,)).fetchone()
+    if None == row:
+        return None
+    try:
+        data = read_npz(io.BytesIO(row[0])).cache_data()
+    except NPZ_ERRORS as e:
+        print("NOTE: dropped the bad build cache entry of build #%d (%s)" % (key[0],e))
+        if not cache_readonly:
+            cache_conn.execute("DELETE FROM build_cache WHERE build_id = ?", (key[0],))
+            cache_conn.commit()
+        return None
+    if not cache_readonly:
+        cache_conn.execute("UPDATE build_cache SET last_used = ? WHERE build_id = ?", (time.time(),key[0]))
+        cache_conn.commit()
+    return data
+
+# Returns True if the build is now in the cache
+def cache_save(bs):
+    key = cache_key(bs.build)
+    if cache_readonly or (None == key) or (None == cache_open()):
+        return False
+    fd = io.BytesIO()
+    write_npz(bs,fd,zipfile.ZIP_DEFLATED,False)
+    payload = fd.getvalue()
+    if len(payload) > CACHE_SIZE_MAX:
+        return False
+    cache_conn.execute("INSERT OR REPLACE INTO build_cache VALUES (?,?,?,?,?,?,?)",
+        key + (CACHE_VERSION,len(payload),time.time(),payload))
+    # evict the least recently used builds past the size limit
+    total = cache_conn.execute("SELECT SUM(size) FROM build_cache").fetchone()[0]
+    for build_id,size in cache_conn.execute("SELECT build_id,size FROM build_cache "
+            "ORDER BY last_used").fetchall():
+        if total <= CACHE_SIZE_MAX:
+            break
+        cache_conn.execute("DELETE FROM build_cache WHERE build_id = ?", (build_id,))
+        total -= size
+    cache_conn.commit()
+    return True
+
+#################################
+# columnar export and import
+#   an analyzed build is written as columns: the task and recipe
+#   tables with their overlap counts, and the time event tables with
+#   the running concurrency ('count') at each event
+#     '.npz'    : a NumPy archive of uncompressed '.npy' columns, like
+#                 'tasks.start', written and read without NumPy
+#     '.arrow'  : Arrow IPC (Feather v2) files, memory-mappable, and
+#     '.parquet': Parquet files, both with pyarrow, one file per table
+#                 like 'x.tasks.parquet' for 'x.parquet'
+#   the recipe and task names are ids into the 'names' column (Arrow
+#   dictionary columns), the times are UTC seconds, NaN for none
+#   with OVERLAPS_EAGER, the overlap lists are CSR 'over_ptr' and
+#   'over_idx' columns (an Arrow 'overlaps' list column)
+#   the build's metadata is JSON, in 'meta' or the Arrow schema metadata
+#   an exported analysis loads back without the database
+#
+
+EXPORT_VERSION=1
+EXPORT_FORMATS=('.npz','.arrow','.parquet')
+EXPORT_TABLES=('tasks','recipes','task_events','recipe_events')
+
+# table -> [(column,array,is a names column)], for a build
+#   the event times are derived, for the readers of the exports
+def export_columns(bs,times=True):
+    columns = {}
+    for table,spans,events in (('tasks',bs.taskList,bs.taskTimeList),('recipes',bs.recipeList,bs.recipeTimeList)):
+        columns[table] = [('recipe',spans.recipe,True)]
+        if None != spans.task:
+            columns[table].append( ('task',spans.task,True) )
+        columns[table] += [('start',spans.start,False),('stop',spans.stop,False),('count',spans.count,False)]
+        if spans.has_overlaps():
+            columns[table] += [('over_ptr',spans.over_ptr,False),('over_idx',spans.over_idx,False)]
+        columns[table[:-1] + '_events'] = [('state',events.state,False),('count',events.count,False),
+            ('row',events.row_id,False)]
+        if times:
+            columns[table[:-1] + '_events'].append( ('time',array('d',map(events.time,range(len(events)))),False) )
+    return columns
+
+def export_meta(bs):
+    return json.dumps({
+        'format':'event_overlap',
+        'version':EXPORT_VERSION,
+        'build':list(bs.build),
+        'build_data':bs.build_data,
+        'recipe_length_max':bs.recipe_length_max,
+        'task_length_max':bs.task_length_max,
+        'task_execute_max':bs.task_execute_max,
+        'recipe_execute_max':bs.recipe_execute_max,
+    })
+
+# A build from its metadata, names and 'table.column' arrays
+def import_columns(meta,names,columns):
+    meta = json.loads(meta)
+    if ('event_overlap' != meta.get('format')) or (EXPORT_VERSION < meta.get('version',0)):
+        raise ValueError('not an event_overlap export, or a newer version')
+    bs = BuildAnalysis(tuple(meta['build']),meta['build_data'])
+    bs.names.extend(names)
+    for table,spans,events in (('tasks',bs.taskList,bs.taskTimeList),('recipes',bs.recipeList,bs.recipeTimeList)):
+        spans.recipe = columns[table + '.recipe']
+        if None != spans.task:
+            spans.task = columns[table + '.task']
+        spans.start = columns[table + '.start']
+        spans.stop = columns[table + '.stop']
+        spans.count = columns[table + '.count']
+        if table + '.over_ptr' in columns:
+            spans.over_ptr = columns[table + '.over_ptr']
+            spans.over_idx = columns[table + '.over_idx']
+        events.state = columns[table[:-1] + '_events.state']
+        events.count = columns[table[:-1] + '_events.count']
+        events.row_id = columns[table[:-1] + '_events.row']
+    for name in ('recipe_length_max','task_length_max','task_execute_max','recipe_execute_max'):
+        setattr(bs,name,meta[name])
+    return bs
+
+def export_format(path):
+    for ext in EXPORT_FORMATS:
+        if path.endswith(ext):
+            if ('.npz' != ext) and (None == pyarrow):
+                print("ERROR: '%s' files need pyarrow, use a '.npz' file" % ext)
+                return None
+            return ext
+    print("ERROR: use a %s file" % '|'.join(EXPORT_FORMATS))
+    return None
+
+# 'x.tasks.parquet' ... for 'x.parquet'
+def export_table_file(path,ext,table):
+    return '%s.%s%s' % (path[:-len(ext)],table,ext)
+
+@profiled
+def export_build(bs,path):
+    ext = export_format(path)
+    if None == ext:
+        return False
+    try:
+        if '.npz' == ext:
+            write_npz(bs,path)
         else:
-            count -= 1;
-        t[TIME_OVERCOUNT] = count;
+            columns = export_columns(bs)
+            for table in EXPORT_TABLES:
+                arrow_columns = {column:values if 'over_' == column[:5]
+                    else arrow_array(values,bs.names if is_names else None) for column,values,is_names in columns[table]}
+                # the CSR overlap lists are one list column
+                if 'over_ptr' in arrow_columns:
+                    arrow_columns['overlaps'] = pyarrow.LargeListArray.from_arrays(
+                        arrow_array(arrow_columns.pop('over_ptr')),arrow_array(arrow_columns.pop('over_idx')))
+                arrow_table = pyarrow.table(arrow_columns,metadata={'event_overlap':export_meta(bs)})
+                if '.arrow' == ext:
+                    pyarrow.feather.write_feather(arrow_table,export_table_file(path,ext,table),
+                        compression='uncompressed')
+                else:
+                    pyarrow.parquet.write_table(arrow_table,export_table_file(path,ext,table))
+    except OSError as e:
+        print("ERROR: Could not write '%s' (%s)" % (path,e))
+        return False
+    print("Done: build #%d exported to '%s'" % (bs.build_data['id'],path))
+    return True
+
+@profiled
+def import_build(path):
+    ext = export_format(path)
+    if None == ext:
+        return None
+    try:
+        if '.npz' == ext:
+            bs = read_npz(path)
+        else:
+            columns = {}
+            names = []
+            name_ids = {}
+            for table in EXPORT_TABLES:
+                file = export_table_file(path,ext,table)
+                if '.arrow' == ext:
+                    arrow_table = pyarrow.feather.read_table(file,memory_map=True)
+                else:
+                    arrow_table = pyarrow.parquet.read_table(file)
+                meta = arrow_table.schema.metadata[b'event_overlap'].decode()
+                for column in arrow_table.column_names:
+                    if 'overlaps' == column:
+                        overlaps = arrow_table.column(column).combine_chunks()
+                        over_ptr = arrow_values(overlaps.offsets)
+                        columns[table + '.over_ptr'] = array('q',(i - over_ptr[0] for i in over_ptr))
+                        columns[table + '.over_idx'] = arrow_values(overlaps.flatten())
+                    else:
+                        columns['%s.%s' % (table,column)] = from_arrow(arrow_table.column(column),names,name_ids)
+            bs = import_columns(meta,names,columns)
+    except NPZ_ERRORS as e:
+        print("ERROR: Could not read '%s' (%s)" % (path,e))
+        return None
+    print("Imported build #%d from '%s'" % (bs.build_data['id'],path))
+    return bs
+
+# the errors of a bad or truncated export
+NPZ_ERRORS=(OSError,EOFError,KeyError,ValueError,SyntaxError,struct.error,zlib.error,zipfile.BadZipFile)
+
+# A build as a '.npz' file (a path or a file object)
+def write_npz(bs,file,compression=zipfile.ZIP_STORED,times=True):
+    columns = export_columns(bs,times)
+    with zipfile.ZipFile(file,'w',compression,allowZip64=True) as zf:
+        write_npy(zf,'meta',array('B',export_meta(bs).encode()))
+        write_npy(zf,'names',bs.names)
+        for table in EXPORT_TABLES:
+            for column,values,is_names in columns[table]:
+                write_npy(zf,'%s.%s' % (table,column),values)
+
+def read_npz(file):
+    with zipfile.ZipFile(file) as zf:
+        columns = {name[:-4]:read_npy(zf.read(name)) for name in zf.namelist() if name.endswith('.npy')}
+    meta = columns.pop('meta').tobytes().decode()
+    return import_columns(meta,columns.pop('names'),columns)
+
+# NumPy '.npy' version 1.0 format: magic, header length, header dict
+# padded to 64 bytes, then the raw column
+def write_npy(zf,name,values):
+    if isinstance(values,list):
+        width = max([1] + [len(value) for value in values])
+        descr = '<U%d' % width
+        data = ''.join(value.ljust(width,'\0') for value in values).encode('utf-32-le')
+    else:
+        descr = npy_descr(values)
+        data = values
+    header = "{'descr': '%s', 'fortran_order': False, 'shape': (%d,), }" % (descr,len(values))
+    header += ' ' * (63 - (10 + len(header)) % 64) + '\n'
+    with zf.open(name + '.npy','w',force_zip64=True) as fd:
+        fd.write(b'\x93NUMPY\x01\x00' + struct.pack('<H',len(header)) + header.encode('latin1'))
+        fd.write(data)
+
+def npy_descr(values):
+    if 1 == values.itemsize:
+        return '|%s1' % ('u' if 'B' == values.typecode else 'i')
+    return '%s%s%d' % ('<' if 'little' == sys.byteorder else '>',
+        'f' if values.typecode in 'fd' else 'i',values.itemsize)
+
+# A '.npy' column as an array, or a list for a string column
+def read_npy(data):
+    if b'\x93NUMPY' != data[:6]:
+        raise ValueError('not a .npy column')
+    if 1 == data[6]:
+        start = 10 + struct.unpack('<H',data[8:10])[0]
+        header = ast.literal_eval(data[10:start].decode('latin1'))
+    else:
+        start = 12 + struct.unpack('<I',data[8:12])[0]
+        header = ast.literal_eval(data[12:start].decode('latin1'))
+    descr = header['descr']
+    length = header['shape'][0]
+    if 'U' == descr[1]:
+        width = int(descr[2:])
+        text = data[start:].decode('utf-32-le' if '<' == descr[0] else 'utf-32-be')
+        if len(text) < length * width:
+            raise ValueError('truncated .npy column')
+        return [text[i*width:(i+1)*width].rstrip('\0') for i in range(length)]
+    for typecode in ('bhiqfd' if 'u' != descr[1] else 'B'):
+        values = array(typecode)
+        if (values.itemsize == int(descr[2:])) and (('f' == descr[1]) == (typecode in 'fd')):
+            values.frombytes(data[start:start + length * values.itemsize])
+            if length != len(values):
+                raise ValueError('truncated .npy column')
+            if descr[0] in '<>' and (descr[0] != ('<' if 'little' == sys.byteorder else '>')):
+                values.byteswap()
+            return values
+    raise ValueError("unknown .npy type '%s'" % descr)
+
+# array typecodes <-> Arrow types
+TYPECODES={'int8':'b','int16':'h','int32':'i','int64':'q','double':'d'}
+ARROW_TYPES={typecode:name for name,typecode in TYPECODES.items()}
+
+# An array as an Arrow column, sharing its buffer, or a dictionary column of names
+def arrow_array(values,names=None):
+    if 'big' == sys.byteorder:
+        values = array(values.typecode,values)
+        values.byteswap()
+    data = pyarrow.Array.from_buffers(pyarrow.type_for_alias(ARROW_TYPES[values.typecode]),len(values),
+        [None,pyarrow.py_buffer(values)])
+    if None == names:
+        return data
+    return pyarrow.DictionaryArray.from_arrays(data,pyarrow.array(names,pyarrow.string()))
+
+# An Arrow column as an array, with its names interned for a dictionary column
+def from_arrow(column,names,name_ids):
+    column = column.combine_chunks()
+    if pyarrow.types.is_string(column.type):
+        column = column.dictionary_encode()
+    if pyarrow.types.is_dictionary(column.type):
+        ids = array('i',(intern_name(names,name_ids,name) for name in column.dictionary.to_pylist()))
+        return array('i',(ids[i] for i in arrow_values(column.indices)))
+    return arrow_values(column)
+
+# The values buffer of a primitive column, as is
+def arrow_values(column):
+    if column.null_count:
+        raise ValueError('null values in an exported column')
+    values = array(TYPECODES[str(column.type)])
+    size = values.itemsize
+    values.frombytes(memoryview(column.buffers()[1])[column.offset * size:(column.offset + len(column)) * size])
+    if 'big' == sys.byteorder:
+        values.byteswap()
+    return values
+
+#################################
+# recipe time spans
+#   indexed by recipe name, built in one pass over the tasks
+#   a span runs from its earliest task start to its latest task stop
+#   cached tasks (no times) do not extend a span
+#
+
+def build_recipe_spans(tasks):
+    spans = {}
+    for recipe,start,stop in zip(tasks.recipe,tasks.start,tasks.stop):
+        span = spans.get(recipe)
+        if None == span:
+            spans[recipe] = [start,stop]
+            continue
+        if (not isnan(start)) and (isnan(span[0]) or (start < span[0])):
+            span[0] = start
+        if (not isnan(stop)) and (isnan(span[1]) or (stop > span[1])):
+            span[1] = stop
+    return spans
+
+# Emit the recipeList, sorted by recipe name, from the span index
+def recipe_span_table(spans,names):
+    recipes = SpanTable(names,False)
+    for recipe in sorted(spans,key=names.__getitem__):
+        recipes.append(recipe,spans[recipe][0],spans[recipe][1])
+    return recipes
+
+#################################
+# map ORM column indexes to column names
+#   the indexes above are the source of truth, the names
+#   are read from the database's own schema
+#
+
+orm_columns={}
+
+def orm_column(table,index):
+    return '"%s"' % orm_table_columns(table)[index]
+
+# column index -> name, empty for a table that is not in the database
+def orm_table_columns(table):
+    if not table in orm_columns:
+        c = conn.cursor()
+        c.execute("PRAGMA table_info(%s)" % table)
+        orm_columns[table] = {column[0]:column[1] for column in c.fetchall()}
+    return orm_columns[table]
+
+# One set-based query for a build's tasks with their recipe names,
+# selecting only the columns the taskList needs
+def task_query(max_records=None):
+    query = ("SELECT r.%s, t.%s, t.%s, t.%s FROM orm_task t"
+             " JOIN orm_recipe r ON r.%s = t.%s"
+             " WHERE t.%s = ? ORDER BY t.%s" %
+             (orm_column('orm_recipe',RECIPE_ORM_NAME),
+              orm_column('orm_task',TASK_ORM_NAME),
+              orm_column('orm_task',TASK_ORM_START),
+              orm_column('orm_task',TASK_ORM_STOP),
+              orm_column('orm_recipe',RECIPE_ORM_ID),
+              orm_column('orm_task',TASK_ORM_RECIPE_ID),
+              orm_column('orm_task',TASK_ORM_BUILD_ID),
+              orm_column('orm_task',TASK_ORM_ID)) )
+    if None != max_records:
+        query += " LIMIT %d" % max_records
+    return query
+
+# The task_query columns and the task id, for the tasks above an id
+def follow_task_query():
+    return ("SELECT t.%s, r.%s, t.%s, t.%s, t.%s FROM orm_task t"
+            " JOIN orm_recipe r ON r.%s = t.%s WHERE t.%s = ? AND t.%s > ? ORDER BY t.%s" %
+            (orm_column('orm_task',TASK_ORM_ID),orm_column('orm_recipe',RECIPE_ORM_NAME),
+             orm_column('orm_task',TASK_ORM_NAME),orm_column('orm_task',TASK_ORM_START),
+             orm_column('orm_task',TASK_ORM_STOP),orm_column('orm_recipe',RECIPE_ORM_ID),
+             orm_column('orm_task',TASK_ORM_RECIPE_ID),orm_column('orm_task',TASK_ORM_BUILD_ID),
+             orm_column('orm_task',TASK_ORM_ID),orm_column('orm_task',TASK_ORM_ID)) )
+
+#################################
+# database indexes and query plans
+#   the loader's queries look up tasks by build_id, recipes by id,
+#   targets by build_id and dependencies by task_id, and depending
+#   on the Toaster version some of these columns have no index
+#   each index below is (table, key columns, more columns), where
+#   the more columns make it a covering index for the loader queries
+#   an index (or the table itself, for an INTEGER PRIMARY KEY key)
+#   that starts with the key columns and has the other columns is
+#   good enough, else 'prepare' can create the index, in a copy of
+#   the database or in place, then shows the query plans and timings
+#
+
+PREPARE_INDEXES=(
+    ('orm_task',(TASK_ORM_BUILD_ID,TASK_ORM_ID),(TASK_ORM_RECIPE_ID,TASK_ORM_NAME,TASK_ORM_START,TASK_ORM_STOP)),
+    ('orm_recipe',(RECIPE_ORM_ID,),(RECIPE_ORM_NAME,)),
+    ('orm_target',(TARGET_ORM_BUILD_ID,),()),
+    ('orm_task_dependency',(TASK_DEPENDENCY_ORM_TASK_ID,),(TASK_DEPENDENCY_ORM_DEPENDS_ON_ID,)),
+    ('orm_build',(BUILD_ORM_COMPLETED_ON,),()),
+)
+# the indexes that the build catalog notes when they are missing
+CATALOG_INDEXES=PREPARE_INDEXES[2:3]+PREPARE_INDEXES[4:5]
+
+# The table's INTEGER PRIMARY KEY column (its rowid), else None
+def rowid_column(table):
+    c = conn.cursor()
+    c.execute("PRAGMA table_info(%s)" % table)
+    keys = [column for column in c.fetchall() if column[5]]
+    if (1 == len(keys)) and ('INTEGER' == keys[0][2].upper()):
+        return keys[0][1]
+    return None
+
+# (name, columns) of each index on the table, and of the table itself
+# for a rowid table, with the rowid that each index entry ends with
+def table_indexes(table):
+    rowid = rowid_column(table)
+    indexes = []
+    if None != rowid:
+        columns = orm_table_columns(table)
+        indexes.append( ('PRIMARY KEY',[rowid] + [columns[i] for i in sorted(columns)]) )
+    c = conn.cursor()
+    c.execute("PRAGMA index_list(%s)" % table)
+    for index in c.fetchall():
+        c.execute("PRAGMA index_info('%s')" % index[1])
+        columns = [info[2] for info in sorted(c.fetchall())]
+        if None != rowid:
+            columns.append(rowid)
+        indexes.append( (index[1],columns) )
+    return indexes
+
+def index_columns(table,key,more):
+    columns = orm_table_columns(table)
+    return [columns[i] for i in key],[columns[i] for i in more]
+
+def index_name(table,key,more):
+    key,more = index_columns(table,key,more)
+    return 'event_overlap_%s_%s' % (table,'_'.join(key + more))
+
+# (table,key,more,the index that serves it or None), for the tables in the database
+def check_indexes(indexes):
+    checked = []
+    for table,key,more in indexes:
+        if not orm_table_columns(table):
+            continue
+        key_names,more_names = index_columns(table,key,more)
+        found = None
+        for name,columns in table_indexes(table):
+            if (key_names == columns[:len(key_names)]) and set(more_names).issubset(columns):
+                found = name
+                break
+        checked.append( (table,key,more,found) )
+    return checked
+
+def create_indexes(indexes,verbose=True):
+    for table,key,more in indexes:
+        key_names,more_names = index_columns(table,key,more)
+        start = time.perf_counter()
+        try:
+            conn.execute('CREATE INDEX IF NOT EXISTS "%s" ON %s(%s)' % (index_name(table,key,more),
+                table,','.join('"%s"' % name for name in key_names + more_names)))
+            conn.commit()
+        except sqlite3.Error as e:
+            print("NOTE: could not index %s(%s) (%s)" % (table,','.join(key_names + more_names),e))
+            return False
+        if verbose:
+            print("Created index %s in %.2fs" % (index_name(table,key,more),time.perf_counter() - start))
+    return True
+
+# (title, query, parameters, table aliases that are expected to be scanned)
+#   the few orm_project rows can be scanned, as can the builds for the list
+def loader_queries(build_id):
+    queries = [
+        ('build list',) + catalog_query() + (('b','p'),),
+        ('build metadata',) + catalog_query(build_id=build_id) + (('p',),),
+        ('build tasks',task_query(),(build_id,),()),
+        ('new tasks (follow)',follow_task_query(),(build_id,0),()),
+    ]
+    if orm_table_columns('orm_task_dependency'):
+        queries.append( ('task dependencies',task_dependency_query(),(build_id,),()) )
+    return queries
+
+# Prints the query plans and timings, returns the number of unexpected table scans
+def show_query_plans(build_id):
+    scans = 0
+    c = conn.cursor()
+    print("Query plans for build #%d:" % build_id)
+    for title,query,values,expected in loader_queries(build_id):
+        c.execute("EXPLAIN QUERY PLAN " + query,values)
+        plan = [row[3] for row in c.fetchall()]
+        start = time.perf_counter()
+        c.execute(query,values)
+        rows = len(c.fetchall())
+        print("  %s: %d rows in %.3fs" % (title,rows,time.perf_counter() - start))
+        for detail in plan:
+            words = detail.split()
+            # a bare 'SCAN table', not a scan of a (covering) index
+            scan = ('SCAN' == words[0]) and (2 == len(words) or 'USING' != words[2])
+            if scan and not words[1] in expected:
+                scans += 1
+                detail += '  <- full table scan'
+            print("    %s" % detail)
+    return scans
+
+def prepare_database(build_id,copy,in_place):
+    if copy and in_place:
+        print("ERROR: use either a copy or in place")
+        return False
+    if in_place and database_readonly:
+        print("ERROR: the database is open %s, use the rw access to index it in place" % database_access)
+        return False
+    checked = check_indexes(PREPARE_INDEXES)
+    print("Indexes:")
+    for table,key,more,found in checked:
+        key_names,more_names = index_columns(table,key,more)
+        print("  %-20s %-50s %s" % (table,'(%s)' % ','.join(key_names + more_names),
+            found if found else 'missing'))
+    missing = [(table,key,more) for table,key,more,found in checked if None == found]
+    if missing and copy:
+        if os.path.exists(copy):
+            print("ERROR: the copy '%s' already exists" % copy)
+            return False
+        print("Copying '%s' to '%s'" % (database_file,copy))
+        with contextlib.closing(sqlite3.connect(copy)) as copy_conn:
+            conn.backup(copy_conn)
+        conn.close()
+        connect_database(copy)
+    if missing and (copy or in_place):
+        if not create_indexes(missing):
+            return False
+        conn.execute("ANALYZE")
+        conn.commit()
+    elif missing:
+        print("NOTE: %d missing indexes, use '--copy FILE' or '--in-place' to create them" % len(missing))
+    print('')
+    scans = show_query_plans(build_id)
+    if scans:
+        print("WARNING: %d full table scans in the loader queries" % scans)
+    return True
+
+#################################
+# Fetch build data from database
+#
+
+def load_build(build_id):
+    recipe_length_max = 0
+    task_length_max = 0
+    max_records = RECORD_MAX
+
+    print("Fetching build #%d" % build_id)
+
+    build_cursor.execute("SELECT * FROM orm_build where id = '%s'" % build_id)
+    build=build_cursor.fetchone()
+    if None == build:
+        print("ERROR: No build or tasks found for this build id!")
+        return None
+    bs = BuildAnalysis(build,fetch_build_metadata(build))
+
+    # Completed builds never change, use the cached tables if present
+    with phase('cache load'):
+        cached = cache_load(build)
+    if None != cached:
+        bs.restore(cached)
+        bs.cached = True
+        return bs
+
+    # Fetch the build's tasks and their recipe names in one query,
+    # a batch of rows at a time
+    names = bs.names
+    name_ids = {}
+    tasks = []
+    with phase('fetch tasks') as p:
+        c = conn.cursor()
+        c.execute(task_query(max_records), (build_id,))
+        for recipe_name,task_name,task_start,task_stop in fetch_rows(c):
+            # get maximum string lengths
+            if recipe_length_max < len(recipe_name):
+                recipe_length_max = len(recipe_name)
+            if task_length_max < len(task_name):
+                task_length_max = len(task_name)
+
+            # intern the names, convert the times (None for cached tasks)
+            tasks.append( (intern_name(names,name_ids,recipe_name),intern_name(names,name_ids,task_name),
+                time_value(task_start),time_value(task_stop)) )
+        p.rows = len(tasks)
+    if 0 == len(tasks):
+        print("ERROR: No build or tasks found for this build id!")
+        return None
+
+    # Add the taskList rows, by recipe then start time
+    with phase('sort tasks') as p:
+        tasks.sort(key=lambda t: (names[t[0]],time_order(t[2])))
+        taskList = bs.taskList
+        for recipe,task,start,stop in tasks:
+            taskList.append(recipe,start,stop,task)
+        p.rows = len(taskList)
+    tasks = None
+
+    # Set the recipe time spans
+    with phase('recipe spans') as p:
+        recipeList = recipe_span_table(build_recipe_spans(taskList),names)
+        p.rows = len(recipeList)
+
+    # Count the overlapping tasks, and recipes (over the span of the recipe's tasks)
+    for title,spans in (('task overlaps',taskList),('recipe overlaps',recipeList)):
+        with phase(title) as p:
+            if OVERLAPS_EAGER:
+                spans.set_overlaps(compute_overlaps(list(zip(spans.start,spans.stop))))
+            else:
+                spans.set_counts(count_overlaps(list(zip(spans.start,spans.stop))))
+            p.rows = len(spans)
+
+    # sort the time events, count the task's and recipe's max thread parallelism
+    with phase('task events') as p:
+        taskTimeList,task_execute_max = build_events(taskList)
+        p.rows = len(taskTimeList)
+    with phase('recipe events') as p:
+        recipeTimeList,recipe_execute_max = build_events(recipeList)
+        p.rows = len(recipeTimeList)
+
+    bs.restore((names,taskList,recipeList,taskTimeList,recipeTimeList,
+        recipe_length_max,task_length_max,task_execute_max,recipe_execute_max))
+    with phase('cache save'):
+        bs.cached = cache_save(bs)
+    return bs
+
+def intern_name(names,name_ids,name):
+    name_id = name_ids.get(name)
+    if None == name_id:
+        name_id = name_ids[name] = len(names)
+        names.append(name)
+    return name_id
+
+# Select a build, from the loaded build LRU when possible
+def fetch_build_data(build_id):
+    with phase('fetch build #%d' % build_id):
+        bs = build_lru_get(build_id)
+        if None == bs:
+            bs = load_build(build_id)
+        else:
+            print("Selecting loaded build #%d" % build_id)
+        return select_build(bs)
+
+# Make a loaded build the current one
+def select_build(bs):
+    global current
+    current = bs
+    if None == bs:
+        return False
+    build_lru_put(bs)
+    print_build_summary(bs)
+    return True
 
+def print_build_summary(bs):
+    build_data = bs.build_data
     print("Build: CompletedOn=%s, Outcome=%s, Project='%s'" %
             (build_data['completed_on'],build_outcome(str(build_data['outcome'])),build_data['project']) )
     print("       Target='%s', Task='%s', Machine='%s'" %
             (build_data['target'],build_data['task'],build_data['machine']) )
-    print('Success: build #%d, Task Count=%d, Recipe Count=%d' % (build_id, len(taskList),len(recipeList)) )
-    return True
+    print('Success: build #%d, Task Count=%d, Recipe Count=%d' %
+            (build_data['id'], len(bs.taskList),len(bs.recipeList)) )
+
+#################################
+# parallel build loading
+#   several builds are loaded in a process pool, each worker process
+#   opens its own read-only connection and returns the loaded results
+#   the results come back in build id order, with at most two per
+#   worker pending so that the loaded builds do not pile up
+#   the main process writes the build cache, the workers only read it
+#
+
+def pool_init(filename,access):
+    global cache_readonly
+    cache_readonly = True
+    connect_database(filename,access)
+    # the loading status lines go to stderr, one whole line per write
+    sys.stdout = open(sys.stderr.fileno(),'w',buffering=1,closefd=False)
+
+# Yields (build_id,function(build_id,*args)) for each build id, in order
+def map_builds(function,build_ids,jobs,*args):
+    jobs = min(jobs or LOAD_JOBS,len(build_ids))
+    # the profile phases are recorded in this process
+    if profiling:
+        jobs = 1
+    if 1 >= jobs:
+        for build_id in build_ids:
+            with phase('load build #%d' % build_id):
+                result = function(build_id,*args)
+            yield build_id,result
+        return
+    print("Loading %d builds in %d processes" % (len(build_ids),jobs))
+    # 'spawn' workers do not inherit the main process's sqlite connections
+    with ProcessPoolExecutor(jobs,multiprocessing.get_context('spawn'),
+            pool_init,(database_file,'immutable' if 'immutable' == database_access else 'ro')) as pool:
+        pending = []
+        for build_id in build_ids:
+            pending.append((build_id,pool.submit(function,build_id,*args)))
+            if 2 * jobs <= len(pending):
+                build_id,future = pending.pop(0)
+                yield build_id,future.result()
+        for build_id,future in pending:
+            yield build_id,future.result()
+
+# Yields (build_id,BuildAnalysis or None) for each build id, in order
+def load_builds(build_ids,jobs=None):
+    for build_id,bs in map_builds(load_build,build_ids,jobs):
+        if (None != bs) and not bs.cached:
+            bs.cached = cache_save(bs)
+        yield build_id,bs
 
 #####################################
 # compute and display histogram data
 
-def compute_histogram (list, key, isFilter, description, is_html=False):
-    HIST_MAX=2000
-    hist=[]
-    hist_top=0
-    for i in range(HIST_MAX):
-        hist.append(0)
-    for t in list:
-        if not isFilter or (START == t[TIME_STATE]):
-            hist[t[key]] += 1;
-            if t[key] > hist_top:
-                hist_top = t[key]
+# Count the occurrences of each value, the buckets grow to fit the data
+#   a reversed span (stop before start) makes the running counts
+#   after its stop one too low, so a count can be negative: it is 0
+def histogram(counts):
+    if (None != numpy) and (0 < len(counts)):
+        return numpy.bincount(numpy.maximum(numpy.asarray(counts,dtype=numpy.int64),0)).tolist()
+    return histogram_python(counts)
+
+def histogram_python(counts):
+    hist=[0]
+    for count in counts:
+        count = max(count,0)
+        if count >= len(hist):
+            hist.extend([0] * (count + 1 - len(hist)))
+        hist[count] += 1;
+    return hist
+
+def compute_histogram (counts, description, is_html=False):
+    hist=histogram(counts)
+    hist_top=len(hist)-1
     if not is_html:
         print("Histogram:"+description)
         print("    ", end='')
@@ -432,84 +2090,81 @@ def compute_histogram (list, key, isFilter, description, is_html=False):
         event_print('  </thead>')
         event_print('  <tbody>')
         event_print('    <tr>')
-        for i in range(hist_top+1):
-            if 0 == (i % 10):
-                if 0 != i:
-                    event_print('</tr>')
-                event_print("    <tr><td>{:3})</td>".format(i), end='')
-            event_print("<td>{:3}</td>".format(hist[i]), end='')
-        event_print("</tr>")
+        for i in range(0,hist_top+1,10):
+            event_print("    <tr><td>{:3})</td>".format(i) +
+                ''.join(["<td>{:3}</td>".format(h) for h in hist[i:i+10]]) + "</tr>")
         event_print('  </tbody>')
         event_print('</table>')
         event_print('<BR><BR>')
 
+@profiled
 def display_statistics(is_html=False):
-    compute_histogram(taskTimeList, TIME_OVERCOUNT, True,
+    taskList = current.taskList
+    recipeList = current.recipeList
+    taskTimeList = current.taskTimeList
+    recipeTimeList = current.recipeTimeList
+    compute_histogram(taskTimeList.start_counts(),
         "For each task, max number of tasks executing in parallel",is_html)
-    compute_histogram(recipeTimeList, TIME_OVERCOUNT, True,
+    compute_histogram(recipeTimeList.start_counts(),
         "For each recipe's task set, max number of recipes executing in parallel",is_html)
-    compute_histogram(taskList, TASK_OVERCOUNT, False,
+    compute_histogram(taskList.count,
         "For each task, max number of tasks that overlap its build",is_html)
-    compute_histogram(recipeList, RECIPE_OVERCOUNT, False,
+    compute_histogram(recipeList.count,
         "For each recipe's task set, max number of recipes that overlap its build",is_html)
 
 #################################
 # display task and recipe tables
 #
 
+@profiled
 def display_tasks(filter_string,show_overlaps):
-    # auto wildcard at end
-    if (0 == len(filter_string)) or ('*' != filter_string[-1]):
-        filter_string = filter_string + '*'
-    filter_string = filter_string.replace('*','.*')
-    prog = re.compile(filter_string)
+    taskList = current.taskList
     if show_overlaps:
         print('Task Table (Recipe,Task,Start,Stop,Overlap count,Overlap list):')
-        for t in taskList:
-            if prog.match(t[TASK_RECIPE]+':'+t[TASK_NAME]):
-                print('  '+str(t))
+        for i in taskList.filter_rows(filter_string):
+            print('  '+str(taskList.row(i)))
     else:
         print('Task Table (Recipe,Task,Start,Stop,Overlap count):')
-        for t in taskList:
-            if prog.match(t[TASK_RECIPE]+':'+t[TASK_NAME]):
-                print('  %s,%s,%s.%d' % (t[TASK_RECIPE]+':'+t[TASK_NAME],t[TASK_START],t[TASK_STOP],t[TASK_OVERCOUNT]))
+        for i in taskList.filter_rows(filter_string):
+            print('  %s,%s,%s.%d' % (taskList.key(i),time_text(taskList.start[i]),
+                time_text(taskList.stop[i]),taskList.count[i]))
 
+@profiled
 def display_recipes(filter_string,show_overlaps):
-    # auto wildcard at end
-    if (0 == len(filter_string)) or ('*' != filter_string[-1]):
-        filter_string = filter_string + '*'
-    filter_string = filter_string.replace('*','.*')
-    prog = re.compile(filter_string)
+    recipeList = current.recipeList
     if show_overlaps:
         print("Recipe Table (Recipe,Start,Stop,Overlap count,Overlap list):")
-        for r in recipeList:
-            if prog.match(r[RECIPE_NAME]):
-                print("  "+str(r))
+        for i in recipeList.filter_rows(filter_string):
+            print("  "+str(recipeList.row(i)))
     else:
         print('Task Table (Recipe,Task,Start,Stop,Overlap count):')
-        for r in recipeList:
-            if prog.match(r[RECIPE_NAME]):
-                print('  %s,%s,%s.%d' % (r[RECIPE_NAME],r[RECIPE_START],r[RECIPE_STOP],r[RECIPE_OVERCOUNT]))
+        for i in recipeList.filter_rows(filter_string):
+            print('  %s,%s,%s.%d' % (recipeList.key(i),time_text(recipeList.start[i]),
+                time_text(recipeList.stop[i]),recipeList.count[i]))
 
 #################################
 # display time event lists
 #
 
+@profiled
 def display_task_events(filter_string):
-    prog = prepare_filter(filter_string)
+    taskTimeList = current.taskTimeList
+    rows = set(current.taskList.filter_rows(filter_string))
     print('Task Event List (State,Overlap Count,Time,Recipe,Task):')
-    for t in taskTimeList:
-        if START == t[TIME_STATE]:
-            if prog.match(t[TIME_RECIPE]+':'+t[TIME_TASK]):
-                print('  '+str(t))
+    for i in range(len(taskTimeList)):
+        if START == taskTimeList.state[i]:
+            if taskTimeList.row_id[i] in rows:
+                print('  '+str(taskTimeList.row(i)))
 
+@profiled
 def display_recipe_events(filter_string):
-    prog = prepare_filter(filter_string)
+    recipeTimeList = current.recipeTimeList
+    rows = set(current.recipeList.filter_rows(filter_string))
     print('Recipe Event List (State,Overlap Count,Time,Recipe):')
-    for r in recipeTimeList:
-        if START == r[TIME_STATE]:
-            if prog.match(r[TIME_RECIPE]):
-                print('  '+str(r))
+    for i in range(len(recipeTimeList)):
+        if START == recipeTimeList.state[i]:
+            if recipeTimeList.row_id[i] in rows:
+                print('  '+str(recipeTimeList.row(i)))
 
 #################################
 # display overlap lists
@@ -520,77 +2175,77 @@ def display_recipe_events(filter_string):
 # if filter_string=n, print the n top maximum overlap sets
 #
 
+@profiled
 def display_task_overlaps(filter_string,file):
+    taskList = current.taskList
     if not output_file_action('open',file):
         return
     if '0' == filter_string:
         event_print('\nTasks with zero overlap:')
-        for t in taskList:
-            if 0 == t[TASK_OVERCOUNT]:
-                event_print('  '+t[TASK_RECIPE]+':'+t[TASK_NAME])
+        for i in range(len(taskList)):
+            if 0 == taskList.count[i]:
+                event_print('  '+taskList.key(i))
     elif filter_string.isdigit():
         max_count = int(filter_string)
         event_print('\nTasks with maximum overlap:')
-        maxTasks = sorted(taskList, key=itemgetter(TASK_OVERCOUNT), reverse=True)
-        last_max=maxTasks[0][TASK_OVERCOUNT]
-        for t in maxTasks:
-            if last_max != t[TASK_OVERCOUNT]:
-                last_max = t[TASK_OVERCOUNT]
+        maxTasks = sorted(range(len(taskList)), key=taskList.count.__getitem__, reverse=True)
+        last_max=taskList.count[maxTasks[0]]
+        for i in maxTasks:
+            if last_max != taskList.count[i]:
+                last_max = taskList.count[i]
                 max_count -= 1
                 if 0 == max_count:
                     break
-            event_print(t[TASK_RECIPE]+':'+t[TASK_NAME]+', COUNT=' + str(t[TASK_OVERCOUNT]) + ')')
-            for o in t[TASK_OVERLIST]:
+            event_print(taskList.key(i)+', COUNT=' + str(taskList.count[i]) + ')')
+            for o in taskList.overlap_names(i):
                 event_print("  %s" % o)
     else:
-        prog = prepare_filter(filter_string)
         event_print('\nTask overlap list (by recipe):')
-        for t in taskList:
-            if prog.match(t[TASK_RECIPE]+':'+t[TASK_NAME]):
-                event_print(t[TASK_RECIPE]+':'+t[TASK_NAME]+', COUNT=' + str(t[TASK_OVERCOUNT]) + ')')
-                if 0 == t[TASK_OVERCOUNT]:
-                    event_print('  Zero overlaps')
-                else:
-                    for o in t[TASK_OVERLIST]:
-                        event_print('  %s' % o)
+        for i in taskList.filter_rows(filter_string):
+            event_print(taskList.key(i)+', COUNT=' + str(taskList.count[i]) + ')')
+            if 0 == taskList.count[i]:
+                event_print('  Zero overlaps')
+            else:
+                for o in taskList.overlap_names(i):
+                    event_print('  %s' % o)
         if 0 == len(taskList):
             event_print("  There are no tasks with zero overlap")
     event_print('')
     output_file_action('close',file)
 
+@profiled
 def display_recipe_overlaps(filter_string,file):
+    recipeList = current.recipeList
     if not output_file_action('open',file):
         return
     if '0' == filter_string:
         event_print("\nRecipes with zero overlap:")
-        for r in recipeList:
-            if 0 == r[RECIPE_OVERCOUNT]:
-                event_print('  '+r[RECIPE_NAME])
+        for i in range(len(recipeList)):
+            if 0 == recipeList.count[i]:
+                event_print('  '+recipeList.key(i))
     elif filter_string.isdigit():
         max_count = int(filter_string)
         event_print("\nRecipes with maximum overlap:")
-        maxRecipes = sorted(recipeList, key=itemgetter(RECIPE_OVERCOUNT), reverse=True)
-        last_max=maxRecipes[0][RECIPE_OVERCOUNT]
-        for r in maxRecipes:
-            if last_max != r[RECIPE_OVERCOUNT]:
-                last_max = r[RECIPE_OVERCOUNT]
+        maxRecipes = sorted(range(len(recipeList)), key=recipeList.count.__getitem__, reverse=True)
+        last_max=recipeList.count[maxRecipes[0]]
+        for i in maxRecipes:
+            if last_max != recipeList.count[i]:
+                last_max = recipeList.count[i]
                 max_count -= 1
                 if 0 == max_count:
                     break
-            event_print(r[RECIPE_NAME]+', COUNT=' + str(r[RECIPE_OVERCOUNT]) + ')')
-            for o in r[RECIPE_OVERLIST]:
+            event_print(recipeList.key(i)+', COUNT=' + str(recipeList.count[i]) + ')')
+            for o in recipeList.overlap_names(i):
                 event_print("  %s" % o)
     else:
-        prog = prepare_filter(filter_string)
         event_print("\nRecipe overlap list:")
-        for r in recipeList:
-            if prog.match(r[RECIPE_NAME]):
-                event_print(r[RECIPE_NAME]+', COUNT=' + str(r[RECIPE_OVERCOUNT]) + ')')
-                if 0 == r[RECIPE_OVERCOUNT]:
-                    event_print("  Zero overlaps")
-                else:
-                    for o in r[RECIPE_OVERLIST]:
-                        event_print("  %s" % o)
+        for i in recipeList.filter_rows(filter_string):
+            event_print(recipeList.key(i)+', COUNT=' + str(recipeList.count[i]) + ')')
+            if 0 == recipeList.count[i]:
+                event_print("  Zero overlaps")
+            else:
+                for o in recipeList.overlap_names(i):
+                    event_print("  %s" % o)
         if 0 == len(recipeList):
             event_print("  There are no recipes with zero overlap")
     event_print('')
@@ -606,6 +2261,9 @@ thread_filter=[]
 thread_class=[]
 
 def display_html_prolog(columns,isTask):
+    build_data = current.build_data
+    taskList = current.taskList
+    recipeList = current.recipeList
     event_print('<?xml version="1.0" encoding="UTF-8"?>')
     event_print('<!DOCTYPE html PUBLIC "-//W3C//DTD XHTML 1.0 Transitional//EN" "http://www.w3.org/TR/xhtml1/DTD/xhtml1-transitional.dtd">')
     event_print('  <html xmlns="http://www.w3.org/1999/xhtml" lang="en" xml:lang="en">')
@@ -657,9 +2315,13 @@ def display_html_prolog(columns,isTask):
     event_print('  </thead>')
     event_print('  <tbody>')
 
+# Cell class transitions for First/continue event, Odd/Even Column, A/B event in column
+HTML_FIRST    = {'oax':'oaf','obx':'obf','eax':'eaf','ebx':'ebf'}
+HTML_CONTINUE = {'oaf':'oac','obf':'obc','eaf':'eac','ebf':'ebc'}
+HTML_TOGGLE   = {'oaf':'obx','oac':'obx','obf':'oax','obc':'oax','eaf':'ebx','eac':'ebx'}
+
 def display_html_line(columns,task,action,position,is_filtered_task):
-    if '-' != action:
-        event_print('    <tr>',end='')
+    cells=[]
     for i in range(columns):
         if i == position:
             if is_filtered_task:
@@ -668,44 +2330,28 @@ def display_html_line(columns,task,action,position,is_filtered_task):
                 content=action
             if '+' == action:
                 # transition to first
-                if 'oax' == thread_class[i]:
-                    thread_class[i] = 'oaf'
-                elif 'obx' == thread_class[i]:
-                    thread_class[i] = 'obf'
-                elif 'eax' == thread_class[i]:
-                    thread_class[i] = 'eaf'
-                elif 'ebx' == thread_class[i]:
-                    thread_class[i] = 'ebf'
+                thread_class[i] = HTML_FIRST.get(thread_class[i],thread_class[i])
             else:
                 # transition to toggled none
-                if thread_class[i] in ('oaf','oac'):
-                    thread_class[i] = 'obx'
-                elif thread_class[i] in ('obf','obc'):
-                    thread_class[i] = 'oax'
-                elif thread_class[i] in ('eaf','eac'):
-                    thread_class[i] = 'ebx'
-                else:
-                    thread_class[i] = 'eax'
+                thread_class[i] = HTML_TOGGLE.get(thread_class[i],'eax')
         elif '' != threads[i]:
             content=thread_filter[i]
             # if first transition to continued
-            if 'oaf' == thread_class[i]:
-                thread_class[i] = 'oac'
-            elif 'obf' == thread_class[i]:
-                thread_class[i] = 'obc'
-            elif 'eaf' == thread_class[i]:
-                thread_class[i] = 'eac'
-            elif 'ebf' == thread_class[i]:
-                thread_class[i] = 'ebc'
+            thread_class[i] = HTML_CONTINUE.get(thread_class[i],thread_class[i])
         else:
             content=''
         if '-' != action:
-            event_print('<td class="%s">%s</td>' % (thread_class[i],content), end='')
+            if ('' == content) and ('x' == thread_class[i][2]):
+                # unstyled empty cell
+                cells.append('<td></td>')
+            else:
+                cells.append('<td class="%s">%s</td>' % (thread_class[i],content))
+    # one write per row
     if '-' != action:
         if is_filtered_task:
-            event_print('<td class="recipe_filter">'+task+'</td></tr>')
+            event_print('    <tr>'+''.join(cells)+'<td class="recipe_filter">'+task+'</td></tr>')
         else:
-            event_print('<td class="recipe">'+task+'</td></tr>')
+            event_print('    <tr>'+''.join(cells)+'<td class="recipe">'+task+'</td></tr>')
 
 def display_html_epilog():
     event_print('  </tbody>')
@@ -715,177 +2361,1034 @@ def display_html_epilog():
     event_print('<body>')
 
 def display_thread_line(columns,task,action,position,is_filtered_task):
-    event_print(' |',end='')
+    cells=[' |']
     for i in range(columns):
         if i == position:
-            event_print(' '+action+' |',end='')
+            cells.append(' '+action+' |')
         elif '' != threads[i]:
-            event_print(' %s |' % thread_filter[i],end='')
+            cells.append(' %s |' % thread_filter[i])
         else:
-            event_print('   |',end='')
+            cells.append('   |')
+    # one write per row
     if is_filtered_task:
-        event_print(' *'+task)
+        cells.append(' *'+task)
     else:
-        event_print(' '+task)
+        cells.append(' '+task)
+    event_print(''.join(cells))
+
+# Assign each span to the lowest free lane at its start event
+#   a min-heap of free lanes and a row->lane map, O(events log lanes)
+#   rows, if set, limits the graph to those span rows
+#   yields (event,action,lane), action is '+' for a start, '-' for
+#   a stop, and ' ' (lane 0) when there is no lane to start or stop
+def assign_lanes(events,lane_count,rows=None):
+    free_lanes = list(range(lane_count))
+    lanes = {}
+    for e in range(len(events)):
+        row = events.row_id[e]
+        if (None != rows) and (not row in rows):
+            continue
+        if START == events.state[e]:
+            if free_lanes:
+                lane = heapq.heappop(free_lanes)
+                lanes[row] = lane
+                yield e,'+',lane
+            else:
+                yield e,' ',0
+        else:
+            lane = lanes.pop(row,None)
+            if None == lane:
+                yield e,' ',0
+            else:
+                heapq.heappush(free_lanes,lane)
+                yield e,'-',lane
 
+@profiled
 def graph_task_overlaps(is_html,filter_string,file):
-    global threads,thread_filter
+    graph_overlaps(is_html,current.taskList,current.taskTimeList,current.task_execute_max,
+        filter_string,file,True)
+
+@profiled
+def graph_recipe_overlaps(is_html,filter_string,file):
+    graph_overlaps(is_html,current.recipeList,current.recipeTimeList,current.recipe_execute_max,
+        filter_string,file,False)
+
+def graph_overlaps(is_html,spans,events,execute_max,filter_string,file,isTask):
+    global threads,thread_filter,thread_class
     if not output_file_action('open',file):
         return
     if is_html:
-        display_html_prolog(task_execute_max,True)
-    else:
+        display_html_prolog(execute_max,isTask)
+    elif isTask:
         event_print('\nGraph Task Overlaps:')
-    threads=[]
-    thread_filter=[]
-    for i in range(task_execute_max):
-        threads.append('')
-        thread_filter.append('')
+    else:
+        event_print("\nGraph Recipe Overlaps:")
+    threads=['']*execute_max
+    thread_filter=['']*execute_max
+    thread_class=[]
+    for i in range(execute_max):
         if 1 == (i % 2):
             thread_class.append('eax')
         else:
             thread_class.append('oax')
-    # setup the filter, if any
-    match_tasks=[]
-    match_overlaps=[]
+    # setup the filter, if any, as sets of span rows
+    match_rows=set()
+    match_overlaps=None
     if filter_string:
-        prog = prepare_filter(filter_string)
-        for t in taskList:
-            if prog.match(t[TASK_RECIPE]+":"+t[TASK_NAME]):
-                match_tasks.append(t[TASK_RECIPE]+":"+t[TASK_NAME])
-                match_overlaps.append(t[TASK_RECIPE]+":"+t[TASK_NAME])
-                match_overlaps.extend(t[TASK_OVERLIST])
-    for t in taskTimeList:
-        task=t[TIME_RECIPE]+":"+t[TIME_TASK]
-        position=0
-        action=' '
-        try:
-            is_filtered_task = (0 <= match_tasks.index(task))
-        except:
-            is_filtered_task=False
-        if filter_string and not task in match_overlaps:
-            continue
-        if START == t[TIME_STATE]:
-            for i in range(task_execute_max):
-                if '' == threads[i]:
-                    threads[i]=task
-                    if is_filtered_task:
-                        thread_filter[i]='*'
-                    else:
-                        thread_filter[i]='"'
-                    position=i
-                    action='+'
-                    break
-        else:
-            for i in range(task_execute_max):
-                if task == threads[i]:
-                    threads[i]=''
-                    position=i
-                    action='-'
-                    break
+        match_overlaps=set()
+        for i in spans.filter_rows(filter_string):
+            match_rows.add(i)
+            match_overlaps.add(i)
+            match_overlaps.update(spans.overlaps(i))
+    for e,action,position in assign_lanes(events,execute_max,match_overlaps):
+        row=events.row_id[e]
+        task=spans.key(row)
+        is_filtered_task = row in match_rows
+        if '+' == action:
+            threads[position]=task
+            if is_filtered_task:
+                thread_filter[position]='*'
+            else:
+                thread_filter[position]='"'
+        elif '-' == action:
+            threads[position]=''
+            thread_filter[position]=''
         if is_html:
-            display_html_line(task_execute_max,task,action,position,is_filtered_task)
+            display_html_line(execute_max,task,action,position,is_filtered_task)
         else:
-            display_thread_line(task_execute_max,task,action,position,is_filtered_task)
+            display_thread_line(execute_max,task,action,position,is_filtered_task)
     if is_html:
         display_html_epilog()
     output_file_action('close',file)
     event_print('')
 
-def graph_recipe_overlaps(is_html,filter_string,file):
-    global threads,thread_filter
-    if not output_file_action('open',file):
-        return
-    if is_html:
-        display_html_prolog(recipe_execute_max,False)
-    else:
-        event_print("\nGraph Recipe Overlaps:")
-    threads=[]
-    for i in range(recipe_execute_max):
-        threads.append('')
-        thread_filter.append('')
-        if 1 == (i % 2):
-            thread_class.append('eax')
+#################################
+# Chrome trace export
+#   the build as Chrome Trace Event JSON, for Perfetto (ui.perfetto.dev)
+#   or chrome://tracing, which zoom and pan smoothly over 100k tasks
+#   each task is a complete ('X') event on the lane ('thread') that
+#   graph_task_overlaps gives it, each recipe an async span from its
+#   first task start to its last task stop, with its tasks nested
+#   under it, and a counter shows the running tasks (without a filter)
+#   the events are written one per line as the event table is walked,
+#   so the trace is never built in memory, a '.gz' file is compressed
+#   the times are microseconds from the first task start, the cached
+#   tasks have no times and are left out
+#
+
+TRACE_PID=1   # the build's process id in the trace
+
+# the event templates, the names are JSON strings
+TRACE_TASK=',{"ph":"X","pid":%d,"tid":%%d,"cat":"task","name":%%s,"ts":%%d,"dur":%%d,' \
+    '"args":{"recipe":%%s,"task":%%s,"overlaps":%%d}}' % TRACE_PID
+TRACE_COUNTER=',{"ph":"C","pid":%d,"name":"running tasks","ts":%%d,"args":{"tasks":%%d}}' % TRACE_PID
+TRACE_SPAN=',{"ph":"%%s","pid":%d,"cat":"recipe","id":"%%d.%%d","name":%%s,"ts":%%d}' % TRACE_PID
+TRACE_RECIPE=',{"ph":"b","pid":%d,"cat":"recipe","id":"%%d.0","name":%%s,"ts":%%d,"args":{"overlaps":%%d}}' % TRACE_PID
+
+def trace_metadata(name,value,tid=None):
+    event = {'ph':'M','pid':TRACE_PID,'name':name,'args':value}
+    if None != tid:
+        event['tid'] = tid
+    return json.dumps(event,separators=(',',':'))
+
+def trace_time(value,origin):
+    return round((value - origin) * 1e6)
+
+# A recipe's async span, and its tasks as nested spans
+#   the 'b' and 'e' events of an async id must nest, so the tasks go
+#   first fit on rows that they do not overlap in: the first row is
+#   nested in the recipe's span, the others have their own ids
+def trace_recipe(j,rows,origin,quoted):
+    taskList = current.taskList
+    recipeList = current.recipeList
+    name = quoted[recipeList.recipe[j]]
+    rows.sort(key=taskList.start.__getitem__)
+    task_rows = []   # [last stop,rows]
+    for i in rows:
+        for task_row in task_rows:
+            if task_row[0] <= taskList.start[i]:
+                break
         else:
-            thread_class.append('oax')
-    # setup the filter, if any
-    match_recipes=[]
-    match_overlaps=[]
+            task_row = [0.0,[]]
+            task_rows.append(task_row)
+        task_row[0] = taskList.stop[i]
+        task_row[1].append(i)
+    for k,task_row in enumerate(task_rows):
+        if 0 == k:
+            event_print(TRACE_RECIPE % (j,name,trace_time(recipeList.start[j],origin),recipeList.count[j]))
+        for i in task_row[1]:
+            task = quoted[taskList.task[i]]
+            event_print(TRACE_SPAN % ('b',j,k,task,trace_time(taskList.start[i],origin)))
+            event_print(TRACE_SPAN % ('e',j,k,task,trace_time(taskList.stop[i],origin)))
+        if 0 == k:
+            event_print(TRACE_SPAN % ('e',j,k,name,trace_time(recipeList.stop[j],origin)))
+
+@profiled
+def trace_build(filter_string,file):
+    bs = current
+    taskList = bs.taskList
+    recipeList = bs.recipeList
+    events = bs.taskTimeList
+    if not output_file_action('open',file):
+        return False
+    origin = events.time(0) if len(events) else 0.0
+    if isnan(origin):
+        origin = 0.0
+    build_data = bs.build_data
+    event_print('{"displayTimeUnit":"ms","otherData":%s,"traceEvents":[' % json.dumps({
+        'build':build_data['id'],'project':build_data['project'],'target':build_data['target'],
+        'machine':build_data['machine'],'outcome':build_outcome(str(build_data['outcome'])),
+        'origin':time_text(origin)}))
+    event_print(trace_metadata('process_name',{'name':"build #%d %s" % (build_data['id'],build_data['target'])}))
+    for lane in range(bs.task_execute_max):
+        event_print(',' + trace_metadata('thread_name',{'name':'lane %d' % lane},lane + 1))
+        event_print(',' + trace_metadata('thread_sort_index',{'sort_index':lane},lane + 1))
+
+    # the filter's tasks and their overlaps, as graph_task_overlaps
+    rows = None
     if filter_string:
-        prog = prepare_filter(filter_string)
-        for r in recipeList:
-            if prog.match(r[RECIPE_NAME]):
-                match_recipes.append(r[RECIPE_NAME])
-                match_overlaps.append(r[RECIPE_NAME])
-                match_overlaps.extend(r[RECIPE_OVERLIST])
-    for t in recipeTimeList:
-        recipe=t[TIME_RECIPE]
-        position=0
-        action=' '
-        try:
-            is_filtered_task = (0 <= match_recipes.index(recipe))
-        except:
-            is_filtered_task=False
-        if filter_string and not recipe in match_overlaps:
+        rows = set()
+        for i in taskList.filter_rows(filter_string):
+            rows.add(i)
+            rows.update(taskList.overlaps(i))
+    quoted = [json.dumps(name) for name in bs.names]
+    traced_recipes = set()
+    for e,action,lane in assign_lanes(events,bs.task_execute_max,rows):
+        i = events.row_id[e]
+        start = taskList.start[i]
+        stop = taskList.stop[i]
+        if isnan(start) or isnan(stop):
             continue
-        if START == t[TIME_STATE]:
-            for i in range(recipe_execute_max):
-                if '' == threads[i]:
-                    threads[i]=recipe
-                    if is_filtered_task:
-                        thread_filter[i]='*'
-                    else:
-                        thread_filter[i]='"'
-                    position=i
-                    action='+'
-                    break
-        else:
-            for i in range(recipe_execute_max):
-                if recipe == threads[i]:
-                    threads[i]=''
-                    thread_filter[i]=''
-                    position=i
-                    action='-'
-                    break
-        if is_html:
-            display_html_line(recipe_execute_max,recipe,action,position,is_filtered_task)
+        if None == rows:
+            event_print(TRACE_COUNTER % (trace_time(events.time(e),origin),events.count[e]))
+        if '+' != action:
+            continue
+        traced_recipes.add(taskList.recipe[i])
+        event_print(TRACE_TASK % (lane + 1,json.dumps(taskList.key(i)),trace_time(start,origin),
+            trace_time(stop,start),quoted[taskList.recipe[i]],quoted[taskList.task[i]],taskList.count[i]))
+
+    # the recipe spans, with their tasks nested under them
+    recipe_rows = {recipeList.recipe[j]:j for j in range(len(recipeList))}
+    task_rows = {}
+    for i in range(len(taskList)):
+        if ((None == rows) or (i in rows)) and not (isnan(taskList.start[i]) or isnan(taskList.stop[i])):
+            task_rows.setdefault(taskList.recipe[i],[]).append(i)
+    for recipe in sorted(traced_recipes,key=lambda r: recipeList.start[recipe_rows[r]]):
+        trace_recipe(recipe_rows[recipe],task_rows[recipe],origin,quoted)
+    event_print(']}')
+    output_file_action('close',file)
+    return True
+
+#################################
+# compare builds
+#   a build is reduced to a profile: per 'recipe:task' and per recipe
+#   duration and overlap count, plus the max parallelism
+#   profiles are joined through their dictionaries (hash joins)
+#   a baseline is one build, or the mean over a window of builds,
+#   and is kept between comparisons against the same window
+#
+
+COMPARE_TOP=20   # default number of task/recipe deltas to report
+
+class BuildProfile:
+    def __init__(self,label):
+        self.label = label
+        self.tasks = {}      # 'recipe:task' -> [duration,overlap count]
+        self.recipes = {}    # 'recipe' -> [duration,overlap count]
+        self.task_execute_max = 0
+        self.recipe_execute_max = 0
+        self.elapsed = NO_TIME
+
+def span_profile(spans):
+    profile = {}
+    for i in range(len(spans)):
+        profile[spans.key(i)] = [spans.stop[i] - spans.start[i],spans.count[i]]
+    return profile
+
+def build_profile(bs):
+    profile = BuildProfile('build #%s' % bs.build_data['id'])
+    profile.tasks = span_profile(bs.taskList)
+    profile.recipes = span_profile(bs.recipeList)
+    profile.task_execute_max = bs.task_execute_max
+    profile.recipe_execute_max = bs.recipe_execute_max
+    timed = [i for i in range(len(bs.recipeList)) if not isnan(bs.recipeList.start[i])]
+    if timed:
+        profile.elapsed = max(bs.recipeList.stop[i] for i in timed) - min(bs.recipeList.start[i] for i in timed)
+    return profile
+
+# Mean of several profiles, each key over the builds that have it
+#   the builds are folded in one at a time, so a window of builds
+#   is never held in memory at once
+class ProfileMean:
+    def __init__(self):
+        self.sums = [{},{}]    # tasks,recipes: key -> [duration sum,samples,overlap sum,builds]
+        self.execute_max = [0,0]
+        self.elapsed = [0.0,0]
+        self.builds = []
+
+    def add(self,profile):
+        for sums,values in zip(self.sums,(profile.tasks,profile.recipes)):
+            for key,(duration,count) in values.items():
+                total = sums.get(key)
+                if None == total:
+                    total = sums[key] = [0.0,0,0,0]
+                if not isnan(duration):
+                    total[0] += duration
+                    total[1] += 1
+                total[2] += count
+                total[3] += 1
+        self.execute_max[0] += profile.task_execute_max
+        self.execute_max[1] += profile.recipe_execute_max
+        if not isnan(profile.elapsed):
+            self.elapsed[0] += profile.elapsed
+            self.elapsed[1] += 1
+        self.builds.append(profile.label)
+
+    def profile(self):
+        count = max(1,len(self.builds))
+        if 1 == len(self.builds):
+            profile = BuildProfile(self.builds[0])
         else:
-            display_thread_line(recipe_execute_max,recipe,action,position,is_filtered_task)
+            profile = BuildProfile('mean of %d builds' % len(self.builds))
+        for values,sums in zip((profile.tasks,profile.recipes),self.sums):
+            for key,(duration,samples,overlaps,builds) in sums.items():
+                values[key] = [duration / samples if samples else NO_TIME,overlaps / builds]
+        profile.task_execute_max = self.execute_max[0] / count
+        profile.recipe_execute_max = self.execute_max[1] / count
+        if self.elapsed[1]:
+            profile.elapsed = self.elapsed[0] / self.elapsed[1]
+        return profile
+
+# '12', '1-50', '1-10,14' -> build id list
+def parse_build_ids(text):
+    build_ids = []
+    for part in text.split(','):
+        if '-' in part:
+            first,last = part.split('-',1)
+            build_ids.extend(range(int(first),int(last)+1))
+        elif part:
+            build_ids.append(int(part))
+    return build_ids
+
+compare_baseline=(None,None)   # (build ids, profile) of the last baseline
+
+# Load a build for its profile
+def load_profile(build_id):
+    bs = load_build(build_id)
+    if None == bs:
+        return None
+    return build_profile(bs)
+
+def baseline_profile(build_ids,jobs=None):
+    global compare_baseline
+    if tuple(build_ids) == compare_baseline[0]:
+        return compare_baseline[1]
+    mean = ProfileMean()
+    # loaded builds are reused, the others are loaded in parallel
+    loaded = {}
+    for build_id in build_ids:
+        if build_id in build_lru:
+            loaded[build_id] = build_profile(build_lru[build_id])
+    profiles = map_builds(load_profile,[b for b in build_ids if not b in loaded],jobs)
+    for build_id in build_ids:
+        profile = loaded[build_id] if build_id in loaded else next(profiles)[1]
+        if None != profile:
+            mean.add(profile)
+    if 0 == len(mean.builds):
+        return None
+    compare_baseline = (tuple(build_ids),mean.profile())
+    return compare_baseline[1]
+
+def display_profile_deltas(title,base,new,filter_string,top):
+    prog = prepare_filter(filter_string)
+    matched = []
+    for key,(duration,count) in new.items():
+        old = base.get(key)
+        if (None != old) and prog.match(key):
+            delta = duration - old[0]
+            matched.append( (0.0 if isnan(delta) else abs(delta),key,old,duration,count) )
+    only_base = sum(1 for key in base if not key in new)
+    only_new = sum(1 for key in new if not key in base)
+    event_print('%s: matched=%d, only in baseline=%d, only in build=%d' % (title,len(matched),only_base,only_new))
+    event_print('  %-50s %10s %10s %10s %9s' % ('Name','Base(s)','Build(s)','Delta(s)','Overlaps'))
+    matched.sort(key=lambda m: m[0],reverse=True)
+    for size,key,old,duration,count in matched[:top]:
+        event_print('  %-50s %10.2f %10.2f %+10.2f %4.0f->%-4d' % (key,old[0],duration,duration-old[0],old[1],count))
+    event_print('')
 
-    if is_html:
-        display_html_epilog()
+@profiled
+def compare_builds(bs,build_ids,filter_string,top,file):
+    base = baseline_profile(build_ids)
+    if None == base:
+        print("ERROR: No baseline builds found for '%s'" % build_ids)
+        return False
+    new = build_profile(bs)
+    if not output_file_action('open',file):
+        return False
+    event_print('\nBuild comparison: %s against baseline %s' % (new.label,base.label))
+    event_print('  Elapsed: %.1fs -> %.1fs (%+.1fs)' % (base.elapsed,new.elapsed,new.elapsed-base.elapsed))
+    event_print('  Task parallelism max: %.1f -> %d (%+.1f)' %
+        (base.task_execute_max,new.task_execute_max,new.task_execute_max-base.task_execute_max))
+    event_print('  Recipe parallelism max: %.1f -> %d (%+.1f)' %
+        (base.recipe_execute_max,new.recipe_execute_max,new.recipe_execute_max-base.recipe_execute_max))
+    event_print('')
+    display_profile_deltas('Task duration deltas',base.tasks,new.tasks,filter_string,top)
+    display_profile_deltas('Recipe duration deltas',base.recipes,new.recipes,filter_string,top)
     output_file_action('close',file)
+    return True
+
+#################################
+# critical path
+#   the chain of tasks that set the build's wall-clock time
+#   each timed task gets its predecessors from orm_task_dependency when
+#   the database has dependency data for the build, through any cached
+#   (untimed) tasks, else from the idle gaps: the task that released it
+#   is the last one to stop before it started, from its own recipe when
+#   that one stopped within CRITICAL_SLOP of the last
+#   with dependencies, a task that started more than CRITICAL_WAIT
+#   after its last dependency stopped waited for a thread slot, and
+#   the task that released it (as from the idle gaps) is a predecessor
+#   too, so that the path goes on through a saturated build
+#   the path walks back from the last task to stop through the
+#   predecessor that stopped last, and the slack of a task is how much
+#   later it could have stopped without delaying the end of the build,
+#   keeping the observed scheduling delay after each releasing task,
+#   so that the path itself has no slack
+#
+
+CRITICAL_TOP=20     # default number of constraining recipes/tasks to report
+CRITICAL_SLOP=1.0   # seconds, prefer a predecessor from the task's own recipe
+CRITICAL_WAIT=1.0   # seconds, a task that started later than this after its dependencies waited for a slot
+
+# (recipe,task,depends recipe,depends task) names for a build's dependencies
+def task_dependency_query():
+    return ("SELECT r1.%s, t1.%s, r2.%s, t2.%s FROM orm_task_dependency d"
+            " JOIN orm_task t1 ON t1.%s = d.%s JOIN orm_recipe r1 ON r1.%s = t1.%s"
+            " JOIN orm_task t2 ON t2.%s = d.%s JOIN orm_recipe r2 ON r2.%s = t2.%s"
+            " WHERE t1.%s = ?" %
+            (orm_column('orm_recipe',RECIPE_ORM_NAME),
+             orm_column('orm_task',TASK_ORM_NAME),
+             orm_column('orm_recipe',RECIPE_ORM_NAME),
+             orm_column('orm_task',TASK_ORM_NAME),
+             orm_column('orm_task',TASK_ORM_ID),
+             orm_column('orm_task_dependency',TASK_DEPENDENCY_ORM_TASK_ID),
+             orm_column('orm_recipe',RECIPE_ORM_ID),
+             orm_column('orm_task',TASK_ORM_RECIPE_ID),
+             orm_column('orm_task',TASK_ORM_ID),
+             orm_column('orm_task_dependency',TASK_DEPENDENCY_ORM_DEPENDS_ON_ID),
+             orm_column('orm_recipe',RECIPE_ORM_ID),
+             orm_column('orm_task',TASK_ORM_RECIPE_ID),
+             orm_column('orm_task',TASK_ORM_BUILD_ID)) )
+
+# The (task row,depends on row) pairs of the build, None without dependency data
+def task_dependency_edges(bs):
+    # an imported build has no database
+    if (None == conn) or not orm_table_columns('orm_task_dependency'):
+        return None
+    taskList = bs.taskList
+    rows = {taskList.key(i):i for i in range(len(taskList))}
+    edges = []
+    c = conn.cursor()
+    c.execute(task_dependency_query(),(bs.build_data['id'],))
+    for recipe,task,depends_recipe,depends_task in fetch_rows(c):
+        row = rows.get(recipe+':'+task)
+        depends = rows.get(depends_recipe+':'+depends_task)
+        if (None != row) and (None != depends):
+            edges.append( (row,depends) )
+    return edges if edges else None
+
+# Timed task row -> predecessor rows, from the dependency edges
+#   a cached task passes on its own timed predecessors
+def dependency_predecessors(taskList,timed,edges):
+    start = taskList.start
+    depends = {}
+    for row,depend in edges:
+        depends.setdefault(row,[]).append(depend)
+
+    # cached task row -> its nearest timed predecessors, depth first
+    passed = {}
+    def cached_predecessors(row):
+        stack = [row]
+        visiting = set()
+        while stack:
+            u = stack[-1]
+            if u in passed:
+                stack.pop()
+                continue
+            pending = [d for d in depends.get(u,()) if isnan(start[d]) and
+                (not d in passed) and (not d in visiting)]
+            if pending:
+                visiting.add(u)
+                stack.extend(pending)
+                continue
+            result = set()
+            for d in depends.get(u,()):
+                if not isnan(start[d]):
+                    result.add(d)
+                else:
+                    result.update(passed.get(d,()))
+            passed[u] = result
+            stack.pop()
+        return passed[row]
+
+    predecessors = {}
+    for i in timed:
+        result = set()
+        for d in depends.get(i,()):
+            if not isnan(start[d]):
+                result.add(d)
+            else:
+                result.update(cached_predecessors(d))
+        predecessors[i] = sorted(result)
+    return predecessors
+
+# Timed task row -> [the task that released it], from the idle gaps
+def gap_predecessors(taskList,timed):
+    start = taskList.start
+    stop = taskList.stop
+    by_stop = sorted(timed,key=lambda i: stop[i])
+    stops = [stop[i] for i in by_stop]
+    recipe_rows = {}
+    for i in by_stop:
+        recipe_rows.setdefault(taskList.recipe[i],[]).append(i)
+    recipe_stops = {recipe:[stop[i] for i in rows] for recipe,rows in recipe_rows.items()}
+
+    # the last task to stop at or before row i's start, that started
+    #   before it (so that zero length tasks never release each other)
+    def released_by(rows,stops,i):
+        k = bisect.bisect_right(stops,start[i]) - 1
+        while (0 <= k) and ((start[rows[k]],rows[k]) >= (start[i],i)):
+            k -= 1
+        return rows[k] if 0 <= k else None
+
+    predecessors = {}
+    for i in timed:
+        last = released_by(by_stop,stops,i)
+        recipe = taskList.recipe[i]
+        own = released_by(recipe_rows[recipe],recipe_stops[recipe],i)
+        if (None != own) and (stop[last] - stop[own] <= CRITICAL_SLOP):
+            last = own
+        predecessors[i] = [] if None == last else [last]
+    return predecessors
+
+# Returns (path rows in time order,row -> slack,source), None for no timed tasks
+def critical_path(bs):
+    taskList = bs.taskList
+    start = taskList.start
+    stop = taskList.stop
+    timed = [i for i in range(len(taskList)) if not isnan(start[i])]
+    if 0 == len(timed):
+        return None
+    edges = task_dependency_edges(bs)
+    if None != edges:
+        predecessors = dependency_predecessors(taskList,timed,edges)
+        gaps = gap_predecessors(taskList,timed)
+        for i in timed:
+            ready = max((stop[p] for p in predecessors[i]),default=NO_TIME)
+            if (isnan(ready) or (CRITICAL_WAIT < start[i] - ready)) and gaps[i] and not gaps[i][0] in predecessors[i]:
+                predecessors[i].append(gaps[i][0])
+        source = 'task dependencies and the thread slot waits'
+    else:
+        predecessors = gap_predecessors(taskList,timed)
+        source = 'idle gaps, no task dependencies in the database'
+
+    # latest stops, each task after all of its successors
+    end = max(stop[i] for i in timed)
+    latest = {i:end for i in timed}
+    successors = dict.fromkeys(timed,0)
+    for i in timed:
+        for p in predecessors[i]:
+            successors[p] += 1
+    order = [i for i in timed if 0 == successors[i]]
+    for i in order:
+        if predecessors[i]:
+            released = max(stop[p] for p in predecessors[i]) + (latest[i] - stop[i])
+            for p in predecessors[i]:
+                if released < latest[p]:
+                    latest[p] = released
+                successors[p] -= 1
+                if 0 == successors[p]:
+                    order.append(p)
+    slack = {i:max(0.0,latest[i] - stop[i]) for i in timed}
+
+    # (a dependency cycle ends the path)
+    path = []
+    on_path = set()
+    i = max(timed,key=lambda i: stop[i])
+    while (None != i) and (not i in on_path):
+        path.append(i)
+        on_path.add(i)
+        i = max(predecessors[i],key=lambda p: stop[p],default=None)
+    path.reverse()
+    return path,slack,source
+
+@profiled
+def display_critical_path(top,file):
+    bs = current
+    taskList = bs.taskList
+    result = critical_path(bs)
+    if None == result:
+        print("ERROR: No timed tasks in build #%d" % bs.build_data['id'])
+        return False
+    path,slack,source = result
+    if not output_file_action('open',file):
+        return False
+    start = taskList.start
+    stop = taskList.stop
+    first = min(start[i] for i in slack)
+    end = max(stop[i] for i in slack)
+    # the busy time is the union of the path tasks, the times that a
+    #   task overlaps the ones before it (from bad task times) count
+    #   once, and are reported as the path overlaps
+    busy = overlapped = 0.0
+    reach = NO_TIME   # the latest stop so far
+    for i in path:
+        begin = start[i] if isnan(reach) else max(start[i],reach)
+        busy += max(0.0,stop[i] - begin)
+        if not isnan(reach):
+            overlapped += max(0.0,min(reach,stop[i]) - start[i])
+            reach = max(reach,stop[i])
+        else:
+            reach = stop[i]
+    covered = end - start[path[0]]
+
+    event_print('\nCritical path: build #%d, from the %s' % (bs.build_data['id'],source))
+    event_print('  Build span: %.1fs, path covers %.1fs (%.0f%%), path tasks=%d, busy=%.1fs, idle gaps=%.1fs%s' %
+        (end - first,covered,100.0 * covered / (end - first) if end > first else 100.0,len(path),busy,
+        max(0.0,(end - first) - busy),', path overlaps=%.1fs' % overlapped if 0.0 < overlapped else ''))
+    event_print('  %10s %10s %8s %8s  %s' % ('Start(s)','Length(s)','Gap(s)','Slack(s)','Task'))
+    previous = None
+    for i in path:
+        gap = 0.0 if None == previous else max(0.0,start[i] - stop[previous])
+        event_print('  %10.1f %10.1f %8.1f %8.1f  %s' %
+            (start[i] - first,stop[i] - start[i],gap,slack[i],taskList.key(i)))
+        previous = i
+
+    # the recipes by their time on the path, with the least slack of their tasks
+    recipes = {}
+    for i in slack:
+        recipe = recipes.setdefault(taskList.recipe_name(i),[0.0,0,slack[i]])
+        recipe[2] = min(recipe[2],slack[i])
+    for i in path:
+        recipe = recipes[taskList.recipe_name(i)]
+        recipe[0] += stop[i] - start[i]
+        recipe[1] += 1
+    constraining = sorted(recipes.items(),key=lambda r: (-r[1][0],r[1][2],r[0]))[:top]
+    event_print('\nRecipes that most constrain the build:')
+    event_print('  %-50s %10s %6s %10s' % ('Recipe','Path(s)','Tasks','Slack(s)'))
+    for name,(length,count,least) in constraining:
+        event_print('  %-50s %10.1f %6d %10.1f' % (name,length,count,least))
+
+    # the tasks off the path that are closest to it
+    on_path = set(path)
+    near = sorted((i for i in slack if not i in on_path),key=lambda i: (slack[i],start[i] - stop[i]))[:top]
+    event_print('\nNear-critical tasks:')
+    event_print('  %-50s %10s %10s' % ('Task','Length(s)','Slack(s)'))
+    for i in near:
+        event_print('  %-50s %10.1f %10.1f' % (taskList.key(i),stop[i] - start[i],slack[i]))
     event_print('')
+    output_file_action('close',file)
+    return True
 
 #################################
-# main loop
+# concurrency timeline
+#   resamples the task events into fixed time buckets in one pass,
+#   each bucket has its busy task-seconds and its peak concurrency
+#   the buckets are written as they complete, so that long builds
+#   stream out; the summary keeps the time spent at each concurrency
+#   level for the percentiles, the idle gaps and the low tail
+#   a '.json' file gets JSON, anything else CSV with '#' summary lines
 #
 
-def main(argv):
-    global build
+TIMELINE_BUCKET=1.0      # default bucket width, seconds
+TIMELINE_LOW=0.5         # low utilization, as a fraction of the thread slots
+TIMELINE_GAP_MIN=1.0     # shortest idle gap to report, seconds
+TIMELINE_PERCENTILES=(50,90,99)
+
+class Timeline:
+    def __init__(self,width,slots):
+        self.width = width
+        self.slots = slots
+        self.origin = NO_TIME
+        self.end = NO_TIME
+        self.busy = 0.0
+        self.levels = {}       # concurrency -> seconds
+        self.gaps = []         # (offset,length) of the idle gaps
+        self.busy_until = 0.0  # offset where the low utilization tail starts
+
+    # the concurrency level that the given fraction of the time stays at or under
+    def percentile(self,percent):
+        span = sum(self.levels.values())
+        total = 0.0
+        for level in sorted(self.levels):
+            total += self.levels[level]
+            if total >= span * percent / 100:
+                return level
+        return 0
+
+    def summary(self):
+        span = self.end - self.origin
+        return OrderedDict([
+            ('start',time_text(self.origin)),
+            ('span',round(span,3)),
+            ('slots',self.slots),
+            ('busy',round(self.busy,3)),
+            ('utilization',round(self.busy / (self.slots * span),4) if (span and self.slots) else 0.0),
+            ('percentiles',OrderedDict(('p%d' % p,self.percentile(p)) for p in TIMELINE_PERCENTILES)),
+            ('idle_gaps',len(self.gaps)),
+            ('idle_total',round(sum((length for offset,length in self.gaps),0.0),3)),
+            ('idle_longest',round(max((length for offset,length in self.gaps),default=0.0),3)),
+            ('low_tail',round(span - self.busy_until,3)),
+            ])
+
+# Yields the (offset,busy seconds,peak concurrency) of each bucket
+#   the last bucket ends with the build, so it can be shorter
+def timeline_buckets(events,timeline):
+    width = timeline.width
+    low = TIMELINE_LOW * timeline.slots
+    level = 0
+    idle_since = None
+    for i in range(len(events)):
+        t = events.time(i)
+        if isnan(t):
+            break   # the untimed events sort last
+        if isnan(timeline.origin):
+            timeline.origin = last = t
+            bucket = 0
+            edge = t + width
+            busy = 0.0
+            peak = 0
+        # close the buckets that end before this event
+        while t >= edge:
+            busy += level * (edge - last)
+            timeline.levels[level] = timeline.levels.get(level,0.0) + (edge - last)
+            if busy >= low * width:
+                timeline.busy_until = edge - timeline.origin
+            timeline.busy += busy
+            yield bucket * width,busy,peak
+            bucket += 1
+            last = edge
+            edge = timeline.origin + (bucket + 1) * width
+            busy = 0.0
+            peak = level
+        busy += level * (t - last)
+        timeline.levels[level] = timeline.levels.get(level,0.0) + (t - last)
+        last = t
+        level = events.count[i]
+        peak = max(peak,level)
+        if (0 == level) and (None == idle_since):
+            idle_since = t
+        elif (0 < level) and (None != idle_since):
+            if TIMELINE_GAP_MIN <= t - idle_since:
+                timeline.gaps.append( (idle_since - timeline.origin,t - idle_since) )
+            idle_since = None
+    if isnan(timeline.origin):
+        return
+    timeline.end = last
+    if last > timeline.origin + bucket * width:
+        if busy >= low * (last - timeline.origin - bucket * width):
+            timeline.busy_until = last - timeline.origin
+        timeline.busy += busy
+        yield bucket * width,busy,peak
+
+@profiled
+def display_timeline(width,slots,file):
+    bs = current
+    if 0 >= width:
+        print("ERROR: The bucket width must be positive")
+        return False
+    timeline = Timeline(width,slots or bs.task_execute_max)
+    as_json = file.endswith('.json') or file.endswith('.json.gz')
+    if not output_file_action('open',file):
+        return False
+    if as_json:
+        event_print('{"build": %d, "bucket": %s, "slots": %d, "columns": ["offset", "busy", "mean", "peak"],' %
+            (bs.build_data['id'],json.dumps(width),timeline.slots))
+        event_print(' "buckets": [',end='')
+        separator = '\n  '
+    else:
+        event_print('offset,busy,mean,peak,utilization')
+    for offset,busy,peak in timeline_buckets(bs.taskTimeList,timeline):
+        length = min(width,timeline.end - timeline.origin - offset) if not isnan(timeline.end) else width
+        mean = busy / length if length else 0.0
+        if as_json:
+            event_print('%s[%.3f, %.3f, %.3f, %d]' % (separator,offset,busy,mean,peak),end='')
+            separator = ',\n  '
+        else:
+            event_print('%.3f,%.3f,%.3f,%d,%.4f' % (offset,busy,mean,peak,mean / timeline.slots if timeline.slots else 0.0))
+    if isnan(timeline.origin):
+        if as_json:
+            event_print('],\n "summary": null}')
+        output_file_action('close',file)
+        print("ERROR: No timed tasks in build #%d" % bs.build_data['id'])
+        return False
+    summary = timeline.summary()
+    if as_json:
+        summary['gaps'] = [[round(offset,3),round(length,3)] for offset,length in timeline.gaps]
+        event_print('],\n "summary": %s}' % json.dumps(summary))
+    else:
+        for name,value in summary.items():
+            if isinstance(value,dict):
+                value = ' '.join('%s=%s' % item for item in value.items())
+            event_print('# %s: %s' % (name,value))
+    output_file_action('close',file)
+    return True
 
-    print("\nWelcome to event_overlap.py: enter '?' for help\n")
+#################################
+# point in time queries
+#   'at <time>' lists the tasks running at a time, and
+#   'window <t1> <t2>' the tasks running at any time in between,
+#   from the build's interval index
+#   times are UTC: 'YYYY-MM-DDTHH:MM:SS', 'HH:MM:SS' on the day of the
+#   build's first task, or '+seconds' after the first task start
+#
 
-    # connect to the database
-    if 0 < len(argv):
-        filename=argv[0]
+def parse_time(bs,text):
+    first = bs.taskTimeList.time(0) if len(bs.taskTimeList) else NO_TIME
+    try:
+        if text.startswith('+'):
+            return first + float(text[1:])
+        if ('-' in text) or ('T' in text):
+            return time_value(text)
+        day = datetime.fromtimestamp(first,timezone.utc).date()
+        value = time_value('%s %s' % (day,text))
+        # a build that runs past midnight
+        if value < first:
+            value += 24*60*60
+        return value
+    except (ValueError,OverflowError):
+        print("ERROR: Unknown time '%s', use 'HH:MM:SS', '+seconds' or 'YYYY-MM-DDTHH:MM:SS'" % text)
+        return None
+
+@profiled
+def display_time_query(times,file):
+    bs = current
+    taskList = bs.taskList
+    if (0 == len(bs.taskTimeList)) or isnan(bs.taskTimeList.time(0)):
+        print("ERROR: No timed tasks in build #%d" % bs.build_data['id'])
+        return False
+    times = [parse_time(bs,text) for text in times]
+    if None in times:
+        return False
+    first = bs.taskTimeList.time(0)
+    if 1 == len(times):
+        rows = bs.task_index().at(times[0])
+        title = 'Tasks running at %s (+%.1fs)' % (time_text(times[0]),times[0] - first)
     else:
-        filename='toaster.sqlite'
-    connect_database(filename)
+        t1,t2 = sorted(times)
+        rows = bs.task_index().window(t1,t2)
+        title = 'Tasks running from %s to %s (+%.1fs to +%.1fs)' % \
+            (time_text(t1),time_text(t2),t1 - first,t2 - first)
+    if not output_file_action('open',file):
+        return False
+    event_print('\n%s: %d' % (title,len(rows)))
+    event_print('  %-26s %-26s %9s  %s' % ('Start','Stop','Length(s)','Task'))
+    for i in rows:
+        start = taskList.start[i]
+        stop = taskList.stop[i]
+        event_print('  %-26s %-26s %9.1f  %s' % (time_text(start),time_text(stop),stop - start,taskList.key(i)))
+    event_print('')
+    output_file_action('close',file)
+    return True
 
-    # fetch the default build data
+#################################
+# live follow mode
+#   polls an IN_PROGRESS build: the orm_task rows above the id
+#   watermark, and the open (started, not stopped) tasks again for
+#   their stop times; tasks without a start time are cached tasks
+#   the new start/stop events go through the same sweep as
+#   count_overlaps, kept running between polls, which appends to
+#   taskTimeList and updates the overlap counts and the parallelism
+#   the interval index and the other derived lookups are rebuilt on
+#   demand, and the build is reloaded once when it completes
+#   a stop that shows up after later starts is applied where the sweep
+#   is, so the live counts can read high until that reload
+#
+
+FOLLOW_INTERVAL=5.0   # default seconds between polls
+FOLLOW_CHUNK=500      # max open task ids per query
+
+class BuildFollower:
+    def __init__(self,build):
+        self.bs = BuildAnalysis(build,fetch_build_metadata(build))
+        self.name_ids = {}
+        self.watermark = 0    # highest orm_task id read
+        self.open = {}        # orm_task id -> taskList row
+        # the running sweep
+        self.active = set()
+        self.started = 0
+        self.stopped = 0
+        self.points = 0
+        self.frontier = NO_TIME
+        self.busy = 0.0
+
+    def poll(self):
+        bs = self.bs
+        taskList = bs.taskList
+        c = conn.cursor()
+        c.execute("SELECT * FROM orm_build where id = '%s'" % bs.build_data['id'])
+        bs.build = c.fetchone()
+        bs.build_data['outcome'] = bs.build[BUILD_ORM_OUTCOME]
+        bs.build_data['completed_on'] = bs.build[BUILD_ORM_COMPLETED_ON]
+
+        events = []
+        # the open tasks that have stopped
+        task_ids = list(self.open)
+        for first in range(0,len(task_ids),FOLLOW_CHUNK):
+            chunk = task_ids[first:first+FOLLOW_CHUNK]
+            c.execute("SELECT %s, %s FROM orm_task WHERE %s IN (%s) AND %s IS NOT NULL" %
+                (orm_column('orm_task',TASK_ORM_ID),orm_column('orm_task',TASK_ORM_STOP),
+                 orm_column('orm_task',TASK_ORM_ID),','.join('?' * len(chunk)),
+                 orm_column('orm_task',TASK_ORM_STOP)), chunk)
+            for task_id,task_stop in c.fetchall():
+                i = self.open.pop(task_id)
+                taskList.stop[i] = time_value(task_stop)
+                events.append( (max(taskList.start[i],taskList.stop[i]),SWEEP_STOP,i) )
+
+        # the new tasks
+        c.execute(follow_task_query(),(bs.build_data['id'],self.watermark))
+        added = 0
+        for task_id,recipe_name,task_name,task_start,task_stop in fetch_rows(c):
+            self.watermark = task_id
+            added += 1
+            bs.recipe_length_max = max(bs.recipe_length_max,len(recipe_name))
+            bs.task_length_max = max(bs.task_length_max,len(task_name))
+            i = len(taskList)
+            start = time_value(task_start)
+            stop = time_value(task_stop)
+            taskList.append(intern_name(bs.names,self.name_ids,recipe_name),start,stop,
+                intern_name(bs.names,self.name_ids,task_name))
+            taskList.count.append(0)
+            if isnan(start):
+                continue
+            if isnan(stop):
+                self.open[task_id] = i
+                events.append( (start,SWEEP_START,i) )
+            elif start < stop:
+                events.append( (start,SWEEP_START,i) )
+                events.append( (stop,SWEEP_STOP,i) )
+            else:
+                events.append( (start,SWEEP_POINT,i) )
+
+        events.sort()
+        for event in events:
+            self.sweep(*event)
+        if events or added:
+            taskList.clear_derived()
+        return added
+
+    # one step of the count_overlaps sweep, on the live tables
+    def sweep(self,t,state,i):
+        taskList = self.bs.taskList
+        count = taskList.count
+        active = self.active
+        if isnan(self.frontier) or (t > self.frontier):
+            if not isnan(self.frontier):
+                self.busy += len(active) * (t - self.frontier)
+            self.frontier = t
+        if SWEEP_STOP == state:
+            active.discard(i)
+            self.stopped += 1
+            count[i] += self.started - 1 + self.points
+            self.add_event(STOP,i)
+        elif SWEEP_POINT == state:
+            stop = taskList.stop[i]
+            if t == stop:
+                count[i] = len(active)
+                self.points += 1
+            else:
+                for j in active:
+                    if taskList.start[j] < stop:
+                        count[i] += 1
+                        count[j] += 1
+            active.add(i)
+            self.add_event(START,i)
+            active.discard(i)
+            self.add_event(STOP,i)
+        else:
+            count[i] -= self.stopped + self.points
+            active.add(i)
+            self.started += 1
+            self.add_event(START,i)
+
+    def add_event(self,state,i):
+        bs = self.bs
+        level = len(self.active)
+        bs.taskTimeList.state.append(state)
+        bs.taskTimeList.count.append(level)
+        bs.taskTimeList.row_id.append(i)
+        bs.task_execute_max = max(bs.task_execute_max,level)
+
+def follow_build(build_id,interval):
+    if not 0 < interval:
+        print("ERROR: The poll interval must be positive")
+        return False
+    if database_access in ('immutable','snapshot'):
+        print("ERROR: an %s database does not change, follow with the rw or ro access" % database_access)
+        return False
+    c = conn.cursor()
+    c.execute("SELECT * FROM orm_build where id = '%s'" % build_id)
+    build = c.fetchone()
+    if None == build:
+        print("ERROR: No build found for this build id!")
+        return False
+    follower = BuildFollower(build)
+    bs = follower.bs
+    print("Following build #%d every %gs, Ctrl-C to stop" % (build_id,interval))
+    try:
+        busy = 0.0
+        frontier = NO_TIME
+        while True:
+            added = follower.poll()
+            taskList = bs.taskList
+            timed = sum(1 for start in taskList.start if not isnan(start))
+            line = "%s build #%d: %d tasks (+%d), %d running, %d done, %d cached, peak %d" % \
+                (datetime.now().strftime('%H:%M:%S'),build_id,len(taskList),added,len(follower.open),
+                 timed - len(follower.open),len(taskList) - timed,bs.task_execute_max)
+            if (not isnan(frontier)) and (follower.frontier > frontier):
+                line += ", mean %.1f over %.1fs" % \
+                    ((follower.busy - busy) / (follower.frontier - frontier),follower.frontier - frontier)
+            print(line,flush=True)
+            busy = follower.busy
+            frontier = follower.frontier
+            if not bs.is_in_progress():
+                print("Build #%d is %s" % (build_id,build_outcome(str(bs.build_data['outcome']))))
+                break
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        print("\nStopped following build #%d" % build_id)
+    # the complete tables, and the recipes
+    return fetch_build_data(build_id)
+
+#################################
+# main loop
+#
+
+def first_build_id():
     try:
         build_cursor.execute('SELECT * FROM orm_build')
         build=build_cursor.fetchone()
     except:
+        build=None
+    if None == build:
         print("ERROR: the database '%s' does not have build data" % database_file)
         exit(1)
-    fetch_build_data(build[BUILD_ORM_ID])
+    return build[BUILD_ORM_ID]
+
+def interactive(filename,access='rw'):
+    print("\nWelcome to event_overlap.py: enter '?' for help\n")
+
+    # connect to the database
+    connect_database(filename,access)
+
+    # fetch the default build data
+    fetch_build_data(first_build_id())
 
     while True:
         # get next command
         command = ''
         arg=''
+        args=[]
         file=''
         commands = input('Command: ').split()
         for i in range(len(commands)):
@@ -897,6 +3400,7 @@ def main(argv):
                     file = commands[i+1]
                 break;
             arg = commands[i]
+            args.append(arg)
 
         # process commands
         if '?' == command[0]:
@@ -908,15 +3412,36 @@ def main(argv):
         elif 'b' == command[0]:
             if 0 == len(arg):
                 show_builds()
+            elif '=' in arg:
+                options = catalog_options(args)
+                if None != options:
+                    show_builds(**options)
+            elif not arg.isdigit():
+                print("ERROR: Use 'build <build_id>' or 'build option=value ...'")
             else:
-                if not fetch_build_data(int(arg)):
-                    build = None
+                fetch_build_data(int(arg))
             continue
         if 0 == len(command):
             continue
+        if 'p' == command[0]:
+            if 'on' == arg or ((2 == len(args)) and ('on' == args[0])):
+                profile_start(args[1] if 2 == len(args) else '')
+                print("Profiling is on%s" % (", dump to '%s.*'" % args[1] if 2 == len(args) else ''))
+            elif 'off' == arg:
+                profile_stop()
+                print("Profiling is off")
+            else:
+                show_profile()
+            continue
+        if 'l' == command[0]:
+            if 1 != len(args):
+                print("ERROR: Use 'load <file>'")
+            else:
+                select_build(import_build(arg))
+            continue
 
         # require build data for the remaining commands
-        if None == build:
+        if None == current:
             print('ERROR: Open a build first to execute this command')
             continue
 
@@ -946,9 +3471,288 @@ def main(argv):
             graph_task_overlaps(True,arg,file)
         elif 'H' == command[0]:
             graph_recipe_overlaps(True,arg,file)
+        elif 'j' == command[0]:
+            trace_build(arg,file)
+        elif 'x' == command[0]:
+            try:
+                build_ids = parse_build_ids(arg)
+            except ValueError:
+                print("ERROR: Use 'compare <build_ids>', like '12', '1-50' or '3,5,7'")
+                continue
+            compare_builds(current,build_ids,'',COMPARE_TOP,file)
+        elif 'c' == command[0]:
+            if arg and not arg.isdigit():
+                print("ERROR: Use 'critical [n]'")
+            else:
+                display_critical_path(int(arg) if arg else CRITICAL_TOP,file)
+        elif 'u' == command[0]:
+            try:
+                bucket = float(arg) if arg else TIMELINE_BUCKET
+            except ValueError:
+                print("ERROR: Use 'util [seconds]'")
+                continue
+            display_timeline(bucket,0,file)
+        elif 'f' == command[0]:
+            try:
+                interval = float(arg) if arg else FOLLOW_INTERVAL
+            except ValueError:
+                print("ERROR: Use 'follow [seconds]'")
+                continue
+            follow_build(current.build_data['id'],interval)
+        elif 'a' == command[0]:
+            if 1 != len(args):
+                print("ERROR: Use 'at <time>'")
+            else:
+                display_time_query(args,file)
+        elif 'w' == command[0]:
+            if 2 != len(args):
+                print("ERROR: Use 'window <time> <time>'")
+            else:
+                display_time_query(args,file)
+        elif 's' == command[0]:
+            if 1 != len(args):
+                print("ERROR: Use 'save <file>'")
+            else:
+                export_build(current,arg)
 
     # clean up and finish
+    cache_close()
     conn.close()
 
+#################################
+# batch mode
+#   scriptable subcommands that mirror the interactive commands
+#   the database is opened once, and the process exits when done
+#   status messages go to stderr, reports to stdout or --output
+#
+
+BATCH_COMMANDS=('builds','data','overlap','graph','html','trace','compare','critical','timeline','at','window','follow',
+    'prepare','export','selftest')
+# the commands that need the database, not an imported build
+DATABASE_COMMANDS=('builds','compare','follow','prepare')
+
+def batch_parser():
+    parser = argparse.ArgumentParser(prog='event_overlap.py',
+        description="Show the task and recipe execution overlaps of Toaster builds. "
+            "Without a command, start the interactive mode.")
+    parser.add_argument('-d','--database',default='toaster.sqlite',
+        help="Toaster database (default: 'toaster.sqlite')")
+    parser.add_argument('-j','--jobs',type=int,default=LOAD_JOBS,
+        help='processes that load several builds in parallel (default: %d)' % LOAD_JOBS)
+    parser.add_argument('-a','--access',choices=DB_ACCESS_MODES,default='rw',
+        help="database access: 'ro' or 'immutable' for a database on shared storage, "
+            "'snapshot' to read the tables into memory once (default: rw)")
+    parser.add_argument('--profile',action='store_true',
+        help='show the time, rows, SQL statements and memory of each phase on stderr, '
+            'the builds load in this process')
+    parser.add_argument('--profile-dump',default='',metavar='PREFIX',
+        help="also write a cProfile 'PREFIX.prof' and a tracemalloc 'PREFIX.malloc.txt'")
+    parser.add_argument('-i','--import',dest='imports',action='append',metavar='FILE',
+        help="report on an exported build (.npz|.arrow|.parquet) instead of the database, "
+            "repeat for several builds")
+    output_args = argparse.ArgumentParser(add_help=False)
+    output_args.add_argument('-o','--output',default='',
+        help="output file, '{build}' is replaced by the build id, "
+            "a '.gz' name is gzip-compressed (default: stdout)")
+    build_args = argparse.ArgumentParser(add_help=False)
+    build_args.add_argument('-b','--build',type=int,action='append',
+        help='build id, repeat for several builds (default: the first build)')
+    filter_args = argparse.ArgumentParser(add_help=False)
+    filter_args.add_argument('-f','--filter',default='',
+        help="recipe/task filter, like 'native-*' ('overlap' also takes 0 or n)")
+    filter_args.add_argument('-R','--recipes',action='store_true',
+        help='report recipes instead of tasks')
+
+    commands = parser.add_subparsers(dest='command',metavar='command')
+    builds = commands.add_parser('builds',parents=[output_args],
+        help='list the builds')
+    builds.add_argument('--outcome',
+        help='only the builds with this outcome, like SUCCEEDED or FAILED')
+    builds.add_argument('--project',
+        help="only the builds of the matching projects, like 'poky*'")
+    builds.add_argument('--since',
+        help="only the builds completed on or after 'YYYY-MM-DD[THH:MM:SS]'")
+    builds.add_argument('--until',
+        help="only the builds completed before 'YYYY-MM-DD[THH:MM:SS]', a day is inclusive")
+    builds.add_argument('--sort',default='id',
+        help="sort by %s, like '--sort=-completed' for the newest first (default: id)" % '|'.join(CATALOG_SORT))
+    builds.add_argument('--limit',type=int,
+        help='show at most this many builds (default: all)')
+    builds.add_argument('--offset',type=int,default=0,
+        help='skip this many builds first, for the next page (default: 0)')
+    commands.add_parser('data',parents=[build_args,output_args],
+        help='show histogram data')
+    commands.add_parser('overlap',parents=[build_args,filter_args,output_args],
+        help='show execution overlaps')
+    commands.add_parser('graph',parents=[build_args,filter_args,output_args],
+        help='graph execution overlap')
+    commands.add_parser('html',parents=[build_args,filter_args,output_args],
+        help='HTML graph execution overlap')
+    trace = commands.add_parser('trace',parents=[build_args,output_args],
+        help='Chrome trace JSON of the tasks and recipes, for Perfetto or chrome://tracing')
+    trace.add_argument('-f','--filter',default='',
+        help="task filter, like 'native-*', the matching tasks and their overlaps are traced")
+    compare = commands.add_parser('compare',parents=[build_args,filter_args,output_args],
+        help='compare task and recipe timings against baseline build(s)')
+    compare.add_argument('--baseline',required=True,
+        help="baseline build ids, like '12' or '1-50' (the mean over a window)")
+    compare.add_argument('--top',type=int,default=COMPARE_TOP,
+        help='number of task/recipe deltas to report (default: %d)' % COMPARE_TOP)
+    critical = commands.add_parser('critical',parents=[build_args,output_args],
+        help='show the critical path of the build')
+    critical.add_argument('--top',type=int,default=CRITICAL_TOP,
+        help='number of constraining recipes/tasks to report (default: %d)' % CRITICAL_TOP)
+    timeline = commands.add_parser('timeline',parents=[build_args,output_args],
+        help="show the task concurrency over time, CSV or JSON for a '.json' output")
+    timeline.add_argument('--bucket',type=float,default=TIMELINE_BUCKET,
+        help='bucket width in seconds (default: %g)' % TIMELINE_BUCKET)
+    timeline.add_argument('--slots',type=int,default=0,
+        help="thread slots, like BB_NUMBER_THREADS (default: the build's peak task parallelism)")
+    at = commands.add_parser('at',parents=[build_args,output_args],
+        help='show the tasks running at a time')
+    at.add_argument('time',nargs=1,
+        help="UTC 'HH:MM:SS', '+seconds' from the first task start, or 'YYYY-MM-DDTHH:MM:SS'")
+    window = commands.add_parser('window',parents=[build_args,output_args],
+        help='show the tasks running in a time window')
+    window.add_argument('time',nargs=2,
+        help="UTC 'HH:MM:SS', '+seconds' from the first task start, or 'YYYY-MM-DDTHH:MM:SS'")
+    follow = commands.add_parser('follow',parents=[build_args],
+        help='follow an IN_PROGRESS build until it completes')
+    follow.add_argument('--interval',type=float,default=FOLLOW_INTERVAL,
+        help='seconds between polls (default: %g)' % FOLLOW_INTERVAL)
+    prepare = commands.add_parser('prepare',parents=[build_args,output_args],
+        help='check the indexes and the query plans of the loader queries')
+    prepare.add_argument('--copy',default='',
+        help='create the missing indexes in this new copy of the database')
+    prepare.add_argument('--in-place',action='store_true',
+        help='create the missing indexes in the database itself')
+    commands.add_parser('export',parents=[build_args,output_args],
+        help="export the analyzed build as columns, a '.npz', '.arrow' or '.parquet' output")
+    commands.add_parser('selftest',
+        help='check the overlap engine against the pairwise scan')
+    return parser
+
+# stdout, or a file for the reports that only print
+@contextlib.contextmanager
+def batch_output(file):
+    if '' == file:
+        yield
+        return
+    with open_output(file) as fd:
+        with contextlib.redirect_stdout(fd):
+            yield
+
+# Run the report of a batch command on the current build
+def batch_report(args,file):
+    if 'data' == args.command:
+        with batch_output(file):
+            display_statistics(False)
+    elif 'export' == args.command:
+        return export_build(current,file)
+    elif 'trace' == args.command:
+        return trace_build(args.filter,file)
+    elif 'compare' == args.command:
+        return compare_builds(current,parse_build_ids(args.baseline),args.filter,args.top,file)
+    elif ('at' == args.command) or ('window' == args.command):
+        return display_time_query(args.time,file)
+    elif 'timeline' == args.command:
+        return display_timeline(args.bucket,args.slots,file)
+    elif 'critical' == args.command:
+        return display_critical_path(args.top,file)
+    elif 'overlap' == args.command:
+        if args.recipes:
+            display_recipe_overlaps(args.filter,file)
+        else:
+            display_task_overlaps(args.filter,file)
+    elif args.recipes:
+        graph_recipe_overlaps('html' == args.command,args.filter,file)
+    else:
+        graph_task_overlaps('html' == args.command,args.filter,file)
+    return True
+
+# Run a batch command on the builds imported with '--import'
+def run_imported(args):
+    if args.command in DATABASE_COMMANDS:
+        print("ERROR: '%s' needs the database, not an imported build" % args.command)
+        return False
+    if args.build:
+        print("ERROR: the imported builds replace '--build'")
+        return False
+    if (1 < len(args.imports)) and ('' != args.output) and (not '{build}' in args.output):
+        print("ERROR: use '{build}' in the output file name for several builds")
+        return False
+    success = True
+    for path in args.imports:
+        with contextlib.redirect_stdout(sys.stderr):
+            if not select_build(import_build(path)):
+                success = False
+                continue
+        if not batch_report(args,args.output.replace('{build}',str(current.build_data['id']))):
+            success = False
+    return success
+
+def run_batch(args):
+    if 'selftest' == args.command:
+        return selftest_overlaps()
+    if 'export' == args.command:
+        if not args.output:
+            print("ERROR: use '--output' for the exported file, like 'build-{build}.npz'")
+            return False
+        if None == export_format(args.output):
+            return False
+    if args.imports:
+        return run_imported(args)
+
+    connect_database(args.database,args.access)
+    try:
+        if 'builds' == args.command:
+            with batch_output(args.output):
+                return show_builds(args.outcome,args.project,args.since,args.until,
+                    args.sort,args.limit,args.offset)
+
+        build_ids = args.build or [first_build_id()]
+        if 'follow' == args.command:
+            return follow_build(build_ids[0],args.interval)
+        if 'prepare' == args.command:
+            with batch_output(args.output):
+                return prepare_database(build_ids[0],args.copy,args.in_place)
+        if (1 < len(build_ids)) and ('' != args.output) and (not '{build}' in args.output):
+            print("ERROR: use '{build}' in the output file name for several builds")
+            return False
+        success = True
+        if 'compare' == args.command:
+            with contextlib.redirect_stdout(sys.stderr):
+                baseline_profile(parse_build_ids(args.baseline),args.jobs)
+        builds = load_builds(build_ids,args.jobs)
+        for build_id in build_ids:
+            with contextlib.redirect_stdout(sys.stderr):
+                if not select_build(next(builds)[1]):
+                    success = False
+                    continue
+            if not batch_report(args,args.output.replace('{build}',str(build_id))):
+                success = False
+        return success
+    finally:
+        cache_close()
+        conn.close()
+
+def main(argv):
+    # legacy form: 'event_overlap.py [database]' starts the interactive mode
+    if (0 < len(argv)) and (not argv[0].startswith('-')) and (not argv[0] in BATCH_COMMANDS):
+        argv = ['--database'] + argv
+    args = batch_parser().parse_args(argv)
+    if args.profile or args.profile_dump:
+        profile_start(args.profile_dump)
+    if None == args.command:
+        interactive(args.database,args.access)
+        success = True
+    else:
+        success = run_batch(args)
+    if profiling:
+        show_profile(sys.stderr)
+        profile_stop()
+    if not success:
+        exit(1)
+
 if __name__ == '__main__':
    main(sys.argv[1:])
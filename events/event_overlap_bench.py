@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# ex:ts=4:sw=4:sts=4:et
+# -*- tab-width: 4; c-basic-offset: 4; indent-tabs-mode: nil -*-
+#
+# Copyright (c) 2017 Wind River Systems, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+
+#
+# Benchmark event_overlap.py on synthetic Toaster databases
+#   for each task count, toaster_db_gen.py writes a one-build database,
+#   then the build loading and the reports are timed, best of 'repeat'
+#     fetch_build_data      : load the build from the database
+#     fetch_build_data_cache: load the build from the build cache
+#     compute_histogram     : the four histograms of the 'd' command
+#     display_task_overlaps : the 'o' report of all tasks
+#     graph_task_overlaps   : the 'g' graph of all tasks
+#   the reports are written to /dev/null, and the results to a JSON file
+#   the build's memoized lookups are cleared before each report run
+#   another event_overlap.py (like an older release) can be timed with
+#   '--script', and '--baseline' shows the ratios to an earlier result
+#
+# Examples:
+#   $ ./event_overlap_bench.py -o bench.json
+#   $ ./event_overlap_bench.py --sizes 1000,10000 --script old/event_overlap.py -o old.json
+#   $ ./event_overlap_bench.py --baseline old.json
+#
+
+import sys
+import os
+import argparse
+import contextlib
+import importlib.util
+import json
+import platform
+import tempfile
+import time
+from datetime import datetime
+
+import toaster_db_gen
+
+BENCH_VERSION=1                       # bump when the JSON results change shape
+BENCH_SIZES=(1000,10000,100000)       # default task counts
+BENCH_REPEAT=3                        # default runs of each step, the best is kept
+BENCH_STEPS=('fetch_build_data','fetch_build_data_cache','compute_histogram',
+    'display_task_overlaps','graph_task_overlaps')
+
+def load_script(path):
+    spec = importlib.util.spec_from_file_location('event_overlap_bench_target',path)
+    module = importlib.util.module_from_spec(spec)
+    # the loader processes pickle the module's classes by name
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+# Forget the loaded builds, so that the next fetch reads the database (or the cache)
+def forget_builds(eo):
+    if hasattr(eo,'build_lru'):
+        eo.build_lru.clear()
+
+# Forget the loaded build's memoized lookups (overlap lists, filter
+# rows, the interval index), so that each report run does the real work
+def forget_derived(eo):
+    current = getattr(eo,'current',None)
+    if (None != current) and hasattr(current.taskList,'clear_derived'):
+        current.taskList.clear_derived()
+        current.recipeList.clear_derived()
+
+# step -> function, for the steps that this event_overlap.py has
+def bench_steps(eo,build_id):
+    cache_size = getattr(eo,'CACHE_SIZE_MAX',0)
+
+    def fetch():
+        forget_builds(eo)
+        eo.fetch_build_data(build_id)
+
+    def fetch_database():
+        eo.CACHE_SIZE_MAX = 0
+        fetch()
+
+    def fetch_cache():
+        eo.CACHE_SIZE_MAX = cache_size
+        fetch()
+
+    steps = {
+        'fetch_build_data':fetch_database if cache_size else fetch,
+        'compute_histogram':lambda: eo.display_statistics(False),
+        'display_task_overlaps':lambda: eo.display_task_overlaps('',os.devnull),
+        'graph_task_overlaps':lambda: eo.graph_task_overlaps(False,'',os.devnull),
+    }
+    if cache_size:
+        steps['fetch_build_data_cache'] = fetch_cache
+    return steps
+
+def bench_size(eo,path,tasks,args):
+    toaster_db_gen.generate(path,1,tasks,args.parallel,args.cached,args.seed)
+    eo.connect_database(path)
+    steps = bench_steps(eo,1)
+    runs = {}
+    # fill the build cache before its runs, and the other steps use the loaded build
+    with open(os.devnull,'w') as devnull, contextlib.redirect_stdout(devnull):
+        for step in BENCH_STEPS:
+            if not step in steps:
+                continue
+            if 'fetch_build_data_cache' == step:
+                steps[step]()
+            runs[step] = []
+            for i in range(args.repeat):
+                if not step.startswith('fetch_'):
+                    forget_derived(eo)
+                start = time.perf_counter()
+                steps[step]()
+                runs[step].append(time.perf_counter() - start)
+    result = {
+        'tasks':tasks,
+        'database_bytes':os.path.getsize(path),
+        'timings':{step:min(times) for step,times in runs.items()},
+        'runs':runs,
+    }
+    current = getattr(eo,'current',None)
+    if None != current:
+        result['recipes'] = len(current.recipeList)
+        result['task_execute_max'] = current.task_execute_max
+    if hasattr(eo,'cache_close'):
+        eo.cache_close()
+    eo.conn.close()
+    return result
+
+def show_results(results,baseline=None):
+    base = {}
+    if None != baseline:
+        base = {result['tasks']:result['timings'] for result in baseline['results']}
+    print("%8s  %-24s %10s%s" % ('Tasks','Step','Seconds','      Ratio' if base else ''))
+    for result in results['results']:
+        for step in BENCH_STEPS:
+            if not step in result['timings']:
+                continue
+            seconds = result['timings'][step]
+            line = "%8d  %-24s %10.4f" % (result['tasks'],step,seconds)
+            before = base.get(result['tasks'],{}).get(step)
+            if before:
+                line += "  %9.2fx" % (seconds / before)
+            print(line)
+
+def main(argv):
+    here = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(prog='event_overlap_bench.py',
+        description='Benchmark event_overlap.py on synthetic Toaster databases.')
+    parser.add_argument('--sizes',default=','.join(str(size) for size in BENCH_SIZES),
+        help="task counts, like '1000,10000' (default: %s)" % ','.join(str(size) for size in BENCH_SIZES))
+    parser.add_argument('--parallel',type=int,default=8,
+        help='thread slots of the generated builds (default: 8)')
+    parser.add_argument('--cached',type=float,default=0.1,
+        help='share of the cached tasks (default: 0.1)')
+    parser.add_argument('--seed',type=int,default=1,
+        help='random seed (default: 1)')
+    parser.add_argument('--repeat',type=int,default=BENCH_REPEAT,
+        help='runs of each step, the best is kept (default: %d)' % BENCH_REPEAT)
+    parser.add_argument('--script',default=os.path.join(here,'event_overlap.py'),
+        help='the event_overlap.py to time (default: the one next to this script)')
+    parser.add_argument('--keep',default='',
+        help='write the databases in this directory and keep them (default: a temporary directory)')
+    parser.add_argument('--baseline',default='',
+        help='a JSON result to show the ratios to')
+    parser.add_argument('-o','--output',default='',
+        help='write the JSON results to this file')
+    args = parser.parse_args(argv)
+
+    try:
+        sizes = [int(size) for size in args.sizes.split(',')]
+    except ValueError:
+        print("ERROR: use task counts like '1000,10000'")
+        return False
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as fd:
+            baseline = json.load(fd)
+
+    eo = load_script(args.script)
+    results = {
+        'version':BENCH_VERSION,
+        'script':os.path.abspath(args.script),
+        'date':datetime.now().isoformat(timespec='seconds'),
+        'python':platform.python_version(),
+        'platform':platform.platform(),
+        'numpy':None != getattr(eo,'numpy',None),
+        'parameters':{'parallel':args.parallel,'cached':args.cached,'seed':args.seed,'repeat':args.repeat},
+        'results':[],
+    }
+    with contextlib.ExitStack() as stack:
+        directory = args.keep or stack.enter_context(tempfile.TemporaryDirectory())
+        for tasks in sizes:
+            path = os.path.join(directory,'bench-%d.sqlite' % tasks)
+            for old in (path,path + getattr(eo,'CACHE_SUFFIX','')):
+                if os.path.exists(old):
+                    os.remove(old)
+            print("Benchmarking %d tasks" % tasks,file=sys.stderr,flush=True)
+            results['results'].append(bench_size(eo,path,tasks,args))
+
+    show_results(results,baseline)
+    if args.output:
+        with open(args.output,'w') as fd:
+            json.dump(results,fd,indent=2)
+        print("\nDone: file '%s' created" % args.output)
+    return True
+
+if __name__ == '__main__':
+    if not main(sys.argv[1:]):
+        exit(1)
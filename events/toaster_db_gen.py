@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+# ex:ts=4:sw=4:sts=4:et
+# -*- tab-width: 4; c-basic-offset: 4; indent-tabs-mode: nil -*-
+#
+# Copyright (c) 2017 Wind River Systems, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+
+#
+# Write a synthetic Toaster database for event_overlap.py
+#   the orm_build, orm_project, orm_target, orm_recipe, orm_task and
+#   orm_task_dependency tables have the column layout that the
+#   BUILD_ORM_*, TARGET_ORM_*, TASK_ORM_* ... indexes expect
+#   each recipe runs the usual task chain, and do_configure waits for
+#   the do_populate_sysroot of a few earlier recipes
+#   the tasks are scheduled on 'parallel' thread slots, like
+#   BB_NUMBER_THREADS, and the 'cached' share of the tasks has no
+#   start and stop time (a setscene task)
+#
+# Examples:
+#   $ ./toaster_db_gen.py toaster.sqlite --tasks 20000 --parallel 16
+#   $ ./toaster_db_gen.py toaster.sqlite --builds 5 --cached 0.5
+#
+
+import sys
+import os
+import argparse
+import random
+import heapq
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+# Toaster's column names, in the order of the ORM indexes
+BUILD_COLUMNS=('id','machine','distro','distro_version','started_on','completed_on','outcome',
+    'cooker_log_path','build_name','project_id','bitbake_version')
+PROJECT_COLUMNS=('id','name','created','updated')
+TARGET_COLUMNS=('id','target','task','is_image','image_size','license_manifest_path','build_id')
+RECIPE_COLUMNS=('id','layer_version_id','name','version')
+TASK_COLUMNS=('id','order','task_executed','outcome','sstate_checksum','path_to_sstate_obj',
+    'task_name','source_url','work_directory','script_type','line_number','message','logfile',
+    'elapsed_time','sstate_result','build_id','recipe_id','cpu_time_system','cpu_time_user',
+    'disk_io_read','disk_io_write','ended','started')
+TASK_DEPENDENCY_COLUMNS=('id','task_id','depends_on_id')
+
+# Each recipe's tasks, with their mean run time in seconds
+TASK_CHAIN=(
+    ('do_fetch',4.0),
+    ('do_unpack',2.0),
+    ('do_patch',1.0),
+    ('do_configure',15.0),
+    ('do_compile',60.0),
+    ('do_install',6.0),
+    ('do_populate_sysroot',2.0),
+    ('do_package',10.0),
+    ('do_packagedata',1.0),
+    ('do_package_write_rpm',8.0),
+    ('do_populate_lic',0.5),
+    ('do_build',0.1),
+)
+SYSROOT_TASK=6        # the TASK_CHAIN task that other recipes wait for
+CONFIGURE_TASK=3      # the TASK_CHAIN task that waits for them
+RECIPE_DEPENDS_MAX=3  # max recipes that a recipe depends on
+
+RECIPE_PREFIXES=('lib','python3-','perl-','gtk+-','core-','meta-','xf86-','recipe-')
+RECIPE_SUFFIXES=('','','','','-native','-cross')
+
+BUILD_START=datetime(2017,5,1,12,0,0)
+TASK_OUTCOME_SUCCESS=0
+TASK_OUTCOME_CACHED=2
+
+#################################
+# schema
+#
+
+def create_tables(conn,dependencies):
+    tables = [
+        ('orm_build',BUILD_COLUMNS),
+        ('orm_project',PROJECT_COLUMNS),
+        ('orm_target',TARGET_COLUMNS),
+        ('orm_recipe',RECIPE_COLUMNS),
+        ('orm_task',TASK_COLUMNS),
+    ]
+    if dependencies:
+        tables.append( ('orm_task_dependency',TASK_DEPENDENCY_COLUMNS) )
+    for table,columns in tables:
+        conn.execute("CREATE TABLE %s (%s)" % (table,', '.join(
+            '"id" integer NOT NULL PRIMARY KEY AUTOINCREMENT' if 'id' == column
+            else '"%s" integer' % column if column.endswith('_id')
+            else '"%s"' % column for column in columns)))
+
+def insert_rows(conn,table,rows):
+    rows = iter(rows)
+    first = next(rows,None)
+    if None == first:
+        return
+    conn.execute("INSERT INTO %s VALUES (%s)" % (table,','.join('?' * len(first))),first)
+    conn.executemany("INSERT INTO %s VALUES (%s)" % (table,','.join('?' * len(first))),rows)
+
+#################################
+# build schedule
+#   a list schedule of the recipes' task graph: when a thread slot is
+#   free, the ready task of the lowest recipe runs next, so recipes
+#   tend to complete in order as with bitbake's default scheduler
+#   a cached task takes no slot and completes when it is ready
+#   the clock never goes back: a task in 'ready' became ready at or
+#   before 'now', so it starts at 'now' at the earliest
+#
+
+# (recipe index, chain index) -> predecessor tasks, for the recipes
+def task_graph(recipes,tasks,rnd):
+    depends = {}
+    for r in range(recipes):
+        for k in range(len(TASK_CHAIN)):
+            if (r * len(TASK_CHAIN) + k) >= tasks:
+                return depends
+            depends[(r,k)] = [(r,k - 1)] if k else []
+        # only the recipes that have the sysroot task
+        earlier = [e for e in range(r) if (e * len(TASK_CHAIN) + SYSROOT_TASK) < tasks]
+        if earlier and ((r,CONFIGURE_TASK) in depends):
+            for e in rnd.sample(earlier,min(len(earlier),rnd.randint(1,RECIPE_DEPENDS_MAX))):
+                depends[(r,CONFIGURE_TASK)].append( (e,SYSROOT_TASK) )
+    return depends
+
+# (recipe index, chain index) -> (start,stop) seconds, None for a cached task
+def schedule(depends,parallel,cached,rnd):
+    waiting = {task:len(before) for task,before in depends.items()}
+    after = {task:[] for task in depends}
+    for task,before in depends.items():
+        for b in before:
+            after[b].append(task)
+    # (ready time,task) not yet ready, and (task,) ready to run
+    pending = [(0.0,task) for task,count in waiting.items() if 0 == count]
+    heapq.heapify(pending)
+    ready = []
+    slots = [0.0] * parallel
+    times = {}
+    now = 0.0
+
+    # a task is ready when its last predecessor stops, which is not
+    # always the last one to be scheduled
+    ready_at = {}
+    def done(task,at):
+        for t in after[task]:
+            waiting[t] -= 1
+            ready_at[t] = max(ready_at.get(t,0.0),at)
+            if 0 == waiting[t]:
+                heapq.heappush(pending,(ready_at[t],t))
+
+    while pending or ready:
+        now = max(now,slots[0])
+        if (not ready) and (now < pending[0][0]):
+            now = pending[0][0]
+        while pending and (pending[0][0] <= now):
+            at,task = heapq.heappop(pending)
+            if rnd.random() < cached:
+                times[task] = None
+                done(task,at)
+            else:
+                heapq.heappush(ready,task)
+        if not ready:
+            continue
+        task = heapq.heappop(ready)
+        heapq.heappop(slots)
+        start = now + rnd.uniform(0.0,0.05)
+        stop = start + rnd.expovariate(1.0 / TASK_CHAIN[task[1]][1])
+        heapq.heappush(slots,stop)
+        times[task] = (start,stop)
+        done(task,stop)
+    return times
+
+# The dependency edges whose task starts before its predecessors are
+# done, a cached task is done when its own predecessors are
+def schedule_errors(depends,times):
+    done = {}
+    def done_at(task):
+        if not task in done:
+            if None != times[task]:
+                done[task] = times[task][1]
+            else:
+                done[task] = max([done_at(b) for b in depends[task]] + [0.0])
+        return done[task]
+    errors = []
+    for task,before in depends.items():
+        if None == times[task]:
+            continue
+        for b in before:
+            if times[task][0] < done_at(b):
+                errors.append( (task,b) )
+    return errors
+
+def time_text(base,seconds):
+    return str(base + timedelta(seconds=seconds))
+
+#################################
+# generate
+#
+
+def generate(path,builds=1,tasks=10000,parallel=8,cached=0.1,seed=1,dependencies=True):
+    recipes = (tasks + len(TASK_CHAIN) - 1) // len(TASK_CHAIN)
+    rnd = random.Random(seed)
+    conn = sqlite3.connect(path)
+    create_tables(conn,dependencies)
+    insert_rows(conn,'orm_project',[(1,'generated',str(BUILD_START),str(BUILD_START))])
+    insert_rows(conn,'orm_recipe',((r + 1,1,'%s%04d%s' % (rnd.choice(RECIPE_PREFIXES),r,
+        rnd.choice(RECIPE_SUFFIXES)),'1.0') for r in range(recipes)))
+
+    task_id = 0
+    dependency_id = 0
+    for build_id in range(1,builds + 1):
+        base = BUILD_START + timedelta(days=build_id - 1)
+        depends = task_graph(recipes,tasks,rnd)
+        times = schedule(depends,parallel,cached,rnd)
+        errors = schedule_errors(depends,times)
+        if errors:
+            raise RuntimeError("build %d: %d tasks start before their dependencies, like %s after %s" %
+                ((build_id,len(errors)) + errors[0]))
+        # the task ids in start order, as Toaster records them
+        order = sorted(times,key=lambda task: (times[task] or (-1.0,))[0])
+        ids = {task:task_id + 1 + i for i,task in enumerate(order)}
+        rows = []
+        for i,task in enumerate(order):
+            r,k = task
+            row = [None] * len(TASK_COLUMNS)
+            row[0] = ids[task]
+            row[1] = i
+            row[2] = None != times[task]
+            row[3] = TASK_OUTCOME_CACHED if None == times[task] else TASK_OUTCOME_SUCCESS
+            row[6] = TASK_CHAIN[k][0]
+            row[15] = build_id
+            row[16] = r + 1
+            if None != times[task]:
+                start,stop = times[task]
+                row[13] = stop - start
+                row[21] = time_text(base,stop)
+                row[22] = time_text(base,start)
+            rows.append(row)
+        insert_rows(conn,'orm_task',rows)
+        task_id += len(order)
+        if dependencies:
+            edges = []
+            for task,before in depends.items():
+                for b in before:
+                    dependency_id += 1
+                    edges.append( (dependency_id,ids[task],ids[b]) )
+            insert_rows(conn,'orm_task_dependency',edges)
+        stops = [t[1] for t in times.values() if None != t]
+        insert_rows(conn,'orm_build',[(build_id,'qemux86-64','poky','2.3',str(base),
+            time_text(base,max(stops) if stops else 0.0),0,'','build-%d' % build_id,1,'1.34')])
+        insert_rows(conn,'orm_target',[(build_id,'core-image-minimal','build',1,0,'',build_id)])
+    conn.commit()
+    conn.close()
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog='toaster_db_gen.py',
+        description='Write a synthetic Toaster database for event_overlap.py.')
+    parser.add_argument('database',
+        help='the database file to write')
+    parser.add_argument('--builds',type=int,default=1,
+        help='number of builds (default: 1)')
+    parser.add_argument('--tasks',type=int,default=10000,
+        help='tasks per build, like 1000 to 100000 (default: 10000)')
+    parser.add_argument('--parallel',type=int,default=8,
+        help='thread slots, like BB_NUMBER_THREADS (default: 8)')
+    parser.add_argument('--cached',type=float,default=0.1,
+        help='share of the tasks that are cached, without times (default: 0.1)')
+    parser.add_argument('--seed',type=int,default=1,
+        help='random seed (default: 1)')
+    parser.add_argument('--no-dependencies',action='store_true',
+        help='do not write the orm_task_dependency table')
+    parser.add_argument('--force',action='store_true',
+        help='replace an existing database file')
+    args = parser.parse_args(argv)
+
+    if (1 > args.builds) or (1 > args.tasks) or (1 > args.parallel) or not (0.0 <= args.cached <= 1.0):
+        print("ERROR: use at least one build, task and thread slot, and a cached share from 0 to 1")
+        return False
+    if os.path.exists(args.database):
+        if not args.force:
+            print("ERROR: '%s' exists, use --force to replace it" % args.database)
+            return False
+        os.remove(args.database)
+    start = time.perf_counter()
+    generate(args.database,args.builds,args.tasks,args.parallel,args.cached,args.seed,
+        not args.no_dependencies)
+    print("Done: '%s' with %d builds of %d tasks in %.1fs" %
+        (args.database,args.builds,args.tasks,time.perf_counter() - start))
+    return True
+
+if __name__ == '__main__':
+    if not main(sys.argv[1:]):
+        exit(1)